@@ -1,103 +1,311 @@
+from __future__ import annotations
+import time
+startup_time = time.perf_counter()  # for --profile-startup
 import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.font as tkfont
-from PIL import Image, ImageTk      # pip install pillow
-from urllib.request import urlopen
 from io import BytesIO
-import random
-from typing import Literal
+import os
+import sys
+from collections import OrderedDict
+from collections.abc import Sequence
+import threading
+import bisect
+from typing import Literal, TYPE_CHECKING
+from order_engine import (Instrument, Menu, MenuCatalog, MenuRows, Order, Table, Journal,
+                          SalesHistory, MenuWatcher, TableClient, OrderEngine, load_menu,
+                          build_parser, is_headless, run_headless)
+# Imported where first used, to keep startup fast:
+# PIL (pip install pillow), urllib.request, concurrent.futures,
+# hashlib and random
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from PIL import Image, ImageTk
+
+
+class InstrumentOverlay:
+    """Debug overlay of the Instrument histograms, toggled with F12"""
+    overlay = None
 
+    @staticmethod
+    def count_widgets(widget) -> int:
+        count = 0
+        stack = [widget]
+        while stack:
+            widget = stack.pop()
+            count += 1
+            stack.extend(widget.winfo_children())
+        return count
 
-class Menu:
-    menu_list = []
-
-    def __init__(self, id, name, price, additional_info) -> None:
-        self.id = id
-        self.name = name
-        self.price = int(price)
-        self.additional_info = additional_info
-        Menu.menu_list.append(self)
+    @staticmethod
+    def count_page_widgets() -> dict[str, int]:
+        """Live widgets per page class, for Instrument.summary()"""
+        widgets = {}
+        if MainApp.container is not None and MainApp.container.winfo_exists():
+            for page in MainApp.container.winfo_children():
+                widgets[page.__class__.__name__] = \
+                    widgets.get(page.__class__.__name__, 0) \
+                    + InstrumentOverlay.count_widgets(page)
+        return widgets
 
-    def get_data(self) -> list:
-        return [self.id, self.name, self.price, self.additional_info]
+    @staticmethod
+    def toggle_overlay(event: tk.Event = None) -> None:
+        """Show or hide the debug overlay"""
+        if InstrumentOverlay.overlay is not None:
+            InstrumentOverlay.overlay.destroy()
+            InstrumentOverlay.overlay = None
+            return
+        InstrumentOverlay.overlay = tk.Label(MainApp.container, justify='left', anchor='nw',
+                                             font=('Courier', 9), bg='black', fg='#7fff7f')
+        InstrumentOverlay.overlay.place(relx=0, rely=0, anchor='nw')
+        InstrumentOverlay.refresh_overlay()
 
+    @staticmethod
+    def refresh_overlay() -> None:
+        overlay = InstrumentOverlay.overlay
+        if overlay is None or not overlay.winfo_exists():
+            return
+        summary = Instrument.summary()
+        lines = [f"{'':<36}{'n':>7}{'p50':>9}{'p95':>9}{'max':>9} ms"]
+        for name, timing in summary['timings'].items():
+            lines.append(f"{name[:36]:<36}{timing['count']:>7}{timing['p50_ms']:>9.2f}"
+                         f"{timing['p95_ms']:>9.2f}{timing['max_ms']:>9.2f}")
+        lines.append('widgets: ' + ', '.join(f"{name} {count}"
+                                             for name, count in summary['widgets'].items()))
+        overlay['text'] = '\n'.join(lines)
+        overlay.lift()
+        overlay.after(500, InstrumentOverlay.refresh_overlay)
 
-class Meals(Menu):
-    additional_info_name = "Kegurihan"
 
-    def __init__(self, id, name, price, tingkat_kegurihan) -> None:
-        super().__init__(id, name, price, tingkat_kegurihan)
+class CustomImage():
+    """Image from URL (fetched and cached on memory and disk)
+
+    Images are cached by (url, size): PhotoImages in an LRU bounded by
+    memory_budget bytes, resized PNGs in cache_dir bounded by
+    disk_budget bytes. Besides the blocking constructor, load_async()
+    downloads and decodes on a worker thread and puts the image on a
+    label once it is ready.
+    """
+    cached_images: OrderedDict[tuple, ImageTk.PhotoImage] = OrderedDict()
+    memory_budget = 64 * 2**20
+    memory_usage = 0
+    cache_dir = os.path.join(MenuCatalog.cache_dir, 'images')  # found from any working directory
+    disk_budget = 32 * 2**20
+    stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+    pending_images: dict[tuple, Future] = {}  # key -> download in progress
+    placeholders = {}
+    executor = None
+    lock = threading.Lock()
 
+    def __init__(self, url: str, size: tuple[int] = (1024, 576)) -> None:
+        try:
+            self.image_tk = CustomImage.get_cached(url, size)
+            if self.image_tk is not None:
+                return
 
-class Drinks(Menu):
-    additional_info_name = "Kemanisan"
+            self.raw_image = CustomImage.fetch(url, size)
+            self.image_tk = CustomImage.put_cached(url, size, self.raw_image)
+        except:
+            print('Failed to fetch image.')
+            raise ConnectionError
 
-    def __init__(self, id, name, price, tingkat_kemanisan) -> None:
-        super().__init__(id, name, price, tingkat_kemanisan)
+    def get_image(self):
+        return self.image_tk
 
+    @staticmethod
+    def get_cached(url: str, size: tuple[int]) -> ImageTk.PhotoImage | None:
+        """PhotoImage from the memory cache"""
+        image_tk = CustomImage.cached_images.get((url, size))
+        if image_tk is not None:
+            CustomImage.cached_images.move_to_end((url, size))
+            CustomImage.count('memory_hits')
+        return image_tk
 
-class Sides(Menu):
-    additional_info_name = "Keviralan"
+    @staticmethod
+    def put_cached(url: str, size: tuple[int], raw_image: Image.Image) -> ImageTk.PhotoImage:
+        """Create PhotoImage on the Tk thread and keep it in the memory cache"""
+        from PIL import ImageTk
+        if (url, size) in CustomImage.cached_images:
+            return CustomImage.cached_images[(url, size)]
+        image_tk = ImageTk.PhotoImage(image=raw_image)
+        CustomImage.cached_images[(url, size)] = image_tk
+        CustomImage.memory_usage += size[0] * size[1] * 4
+        # Widgets showing an evicted image keep their own reference
+        while CustomImage.memory_usage > CustomImage.memory_budget \
+                and len(CustomImage.cached_images) > 1:
+            (_, old_size), _ = CustomImage.cached_images.popitem(last=False)
+            CustomImage.memory_usage -= old_size[0] * old_size[1] * 4
+        return image_tk
 
-    def __init__(self, id, name, price, tingkat_keviralan) -> None:
-        super().__init__(id, name, price, tingkat_keviralan)
+    @staticmethod
+    def count(stat: str) -> None:
+        with CustomImage.lock:
+            CustomImage.stats[stat] += 1
 
+    @staticmethod
+    def get_disk_path(url: str, size: tuple[int]) -> str:
+        import hashlib
+        key = hashlib.sha256(f"{url}|{size[0]}x{size[1]}".encode()).hexdigest()
+        return os.path.join(CustomImage.cache_dir, key + '.png')
 
-class OrderedMenu:
-    def __init__(self, menu: Meals | Drinks | Sides, quantity: int) -> None:
-        self.menu = menu
-        self.quantity = quantity
+    @staticmethod
+    def read_disk_cache(url: str, size: tuple[int]) -> Image.Image | None:
+        """Resized image from disk, invalid files are removed"""
+        from PIL import Image
+        path = CustomImage.get_disk_path(url, size)
+        try:
+            raw_image = Image.open(path)
+            raw_image.load()
+            if raw_image.size != tuple(size):
+                raise ValueError(f"{path} has size {raw_image.size}")
+        except FileNotFoundError:
+            return None
+        except Exception:
+            print('Invalid cached image, fetching again.')
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)  # mark as recently used
+        return raw_image
 
+    @staticmethod
+    def write_disk_cache(url: str, size: tuple[int], raw_image: Image.Image) -> None:
+        """Store resized image, then evict least recently used files"""
+        path = CustomImage.get_disk_path(url, size)
+        try:
+            # The parent holds the menu cache too, keep it private
+            os.makedirs(os.path.dirname(CustomImage.cache_dir), mode=0o700, exist_ok=True)
+            os.makedirs(CustomImage.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            raw_image.save(temp_path, format='PNG')
+            os.replace(temp_path, path)
+
+            entries = [entry for entry in os.scandir(CustomImage.cache_dir)
+                       if entry.name.endswith('.png')]
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            total_size = sum(entry.stat().st_size for entry in entries)
+            for entry in entries[:-1]:
+                if total_size <= CustomImage.disk_budget:
+                    break
+                total_size -= entry.stat().st_size
+                os.remove(entry.path)
+        except OSError:
+            print('Failed to write image cache.')
 
-class Order:
-    def __init__(self, table_number: int, username: tk.StringVar, menu_list: list[OrderedMenu]) -> None:
-        self.table_number = table_number
-        self.username = username
-        self.menu_list = menu_list
+    @staticmethod
+    @Instrument.timed
+    def fetch(url: str, size: tuple[int]) -> Image.Image:
+        """Read image from disk cache or download it, safe to call from any thread"""
+        raw_image = CustomImage.read_disk_cache(url, size)
+        if raw_image is not None:
+            CustomImage.count('disk_hits')
+            return raw_image
+
+        from urllib.request import urlopen
+        CustomImage.count('misses')
+        requested_data = urlopen(url).read()
+        raw_image = CustomImage.decode(requested_data, size)
+        CustomImage.write_disk_cache(url, size, raw_image)
+        return raw_image
 
+    @staticmethod
+    def decode(data: bytes, size: tuple[int]) -> Image.Image:
+        """Decode image and resize it
 
-class Table:
-    all_tables: dict[int, Order] = dict(
-        (number, None) for number in range(1, 11))
+        JPEGs are decoded in draft mode at the smallest scale that still
+        covers size. Resizing reduces by an integer factor first and
+        resamples the remainder in the same step.
+        """
+        from PIL import Image
+        raw_image = Image.open(BytesIO(data))
+        raw_image.draft('RGB', tuple(size))
+        if raw_image.mode not in ('RGB', 'RGBA', 'L'):
+            raw_image = raw_image.convert('RGBA')
+        return raw_image.resize(tuple(size), Image.Resampling.BICUBIC, reducing_gap=2.0)
 
     @staticmethod
-    def book(table_number: int, order: Order) -> None:
-        Table.all_tables[table_number] = order
+    def request(url: str, size: tuple[int] = (1024, 576)) -> Future:
+        """Start fetching on the worker pool, sharing requests per url and size"""
+        with CustomImage.lock:
+            future = CustomImage.pending_images.get((url, size))
+            if future is None:
+                if CustomImage.executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    CustomImage.executor = ThreadPoolExecutor(
+                        max_workers=4, thread_name_prefix='CustomImage')
+                future = CustomImage.executor.submit(
+                    CustomImage.fetch, url, size)
+                CustomImage.pending_images[(url, size)] = future
+            return future
 
     @staticmethod
-    def get_available() -> list[int]:
-        return [number for number in Table.all_tables if Table.all_tables[number] == None]
+    def prefetch(urls, size: tuple[int] = (1024, 576)) -> None:
+        for url in urls:
+            if (url, size) not in CustomImage.cached_images:
+                CustomImage.request(url, size)
 
     @staticmethod
-    def get_booked() -> list[int]:
-        return [number for number in Table.all_tables if Table.all_tables[number] != None]
+    def load_async(label: tk.Label, url: str, size: tuple[int] = (1024, 576)) -> None:
+        """Show a blank placeholder on label, then the image once fetched"""
+        image_tk = CustomImage.get_cached(url, size)
+        if image_tk is not None:
+            label.configure(image=image_tk)
+            label.image = image_tk
+            return
+        if size not in CustomImage.placeholders:
+            CustomImage.placeholders[size] = tk.PhotoImage(
+                width=size[0], height=size[1])
+        label.configure(image=CustomImage.placeholders[size])
 
-    @staticmethod
-    def checkout(table_number) -> None:
-        Table.all_tables[table_number] = None
+        future = CustomImage.request(url, size)
 
+        def poll() -> None:
+            if not label.winfo_exists():
+                return
+            if not future.done():
+                label.after(50, poll)
+                return
+            with CustomImage.lock:
+                if CustomImage.pending_images.get((url, size)) is future:
+                    del CustomImage.pending_images[(url, size)]
+            try:
+                image_tk = CustomImage.cached_images.get((url, size)) \
+                    or CustomImage.put_cached(url, size, future.result())
+            except:
+                print('Failed to fetch image.')
+                return
+            label.configure(image=image_tk)
+            label.image = image_tk
+        label.after(0, poll)
 
-class CustomImage():
-    """Image from URL (fetched and cached on memory)"""
-    cached_images = {}
 
-    def __init__(self, url: str, size: tuple[int] = (1024, 576)) -> None:
-        try:
-            if url in CustomImage.cached_images:
-                self.image_tk = CustomImage.cached_images[url]
-                return
+class StartupProfiler:
+    """Time of each startup step, printed with --profile-startup"""
+    enabled = False
+    steps = []
+    last_time = startup_time
 
-            self.requested_data = urlopen(url).read()
-            self.raw_image = Image.open(
-                BytesIO(self.requested_data)).resize(size)
-            self.image_tk = ImageTk.PhotoImage(image=self.raw_image)
-            CustomImage.cached_images[url] = self.image_tk
-        except:
-            print('Failed to fetch image.')
-            raise ConnectionError
+    @staticmethod
+    def mark(step: str) -> None:
+        """Record the time since the previous mark as step"""
+        now = time.perf_counter()
+        StartupProfiler.steps.append((step, now - StartupProfiler.last_time))
+        StartupProfiler.last_time = now
 
-    def get_image(self):
-        return self.image_tk
+    @staticmethod
+    def report() -> None:
+        if not StartupProfiler.enabled:
+            return
+        print("Startup profile:")
+        for step, duration in StartupProfiler.steps:
+            print(f"  {step:<24}{duration * 1000:8.1f} ms")
+        total = StartupProfiler.last_time - startup_time
+        print(f"  {'total':<24}{total * 1000:8.1f} ms")
+        deferred = [name for name in ('PIL.Image', 'urllib.request', 'concurrent.futures')
+                    if name in sys.modules]
+        print(f"  deferred modules loaded so far: {', '.join(deferred) or 'none'}")
 
 
 class Style:
@@ -145,6 +353,7 @@ class MainApp(tk.Tk):
     """Base of app window and routes"""
     container = None
     page_stack = []
+    page_pool = {}  # (page class, mode) -> page, built once and reused
     window_width = 1024
     window_height = 576
 
@@ -164,14 +373,34 @@ class MainApp(tk.Tk):
                   fieldbackground=[('readonly', '#ffcd7e')],
                   background=[('readonly', '#ffcd7e')])
 
+        CustomImage.prefetch(page.background_url for page in (
+            LandingPage, CreateOrderPage, DisplayMenuPage, TableDisplayPage))
+
         MainApp.container = tk.Frame(self)
         MainApp.container.pack(fill=tk.BOTH, expand=True)
+        if Instrument.enabled:
+            Instrument.widget_counter = InstrumentOverlay.count_page_widgets
+            self.bind_all('<F12>', InstrumentOverlay.toggle_overlay)
 
-        initial_page = LandingPage(MainApp.container)
+        initial_page = MainApp.get_page(LandingPage)
         MainApp.page_stack.append(initial_page)
         initial_page.pack()
 
     @staticmethod
+    @Instrument.timed
+    def get_page(page_class, **kwargs) -> tk.Frame:
+        """Get pooled page reset with kwargs, build it on first use"""
+        key = (page_class, kwargs.get('mode'))
+        page = MainApp.page_pool.get(key)
+        if page is None:
+            page = page_class(MainApp.container, **kwargs)
+            MainApp.page_pool[key] = page
+        else:
+            page.reset(**kwargs)
+        return page
+
+    @staticmethod
+    @Instrument.timed
     def show_page(to_page: tk.Frame) -> None:
         """Add page to app stack pages"""
         if len(MainApp.page_stack) > 0:
@@ -180,6 +409,7 @@ class MainApp(tk.Tk):
         to_page.pack()
 
     @staticmethod
+    @Instrument.timed
     def back() -> None:
         """Go back to previous page"""
         current_page = MainApp.page_stack.pop()
@@ -188,11 +418,12 @@ class MainApp(tk.Tk):
         previous_page.pack()
 
     @staticmethod
+    @Instrument.timed
     def clear() -> None:
         """Clear pages stack and display landing page"""
         for page in reversed(MainApp.page_stack):
-            page.destroy()
-        MainApp.page_stack = [LandingPage(MainApp.container)]
+            page.pack_forget()
+        MainApp.page_stack = [MainApp.get_page(LandingPage)]
         MainApp.page_stack[0].pack()
 
     @staticmethod
@@ -207,55 +438,60 @@ class MainApp(tk.Tk):
 
 
 class LandingPage(tk.Frame):
+    background_url = 'https://res.cloudinary.com/elhamdi/image/upload/v1670668326/landing_page_iycqcn.png'
+
+    @Instrument.timed
     def __init__(self, master=None):
         super().__init__(master, width=MainApp.window_width, height=MainApp.window_height)
 
-        try:
-            self.background_image = CustomImage(
-                url='https://res.cloudinary.com/elhamdi/image/upload/v1670668326/landing_page_iycqcn.png').get_image()
-            background_image_label = tk.Label(
-                self, image=self.background_image)
-            background_image_label.place(relx=.5, rely=.5, anchor='center')
-        except:
-            pass
-
-        button1 = tk.Button(self, text="Buat Pesanan", width=30,
-                            font=Style.font_large, command=self.create_order, **Style.button_red, )
-        button2 = tk.Button(self, text="Selesai Gunakan Meja", width=30,
-                            font=Style.font_large, command=self.checkout, **Style.button_red, )
-        button1.place(relx=.5, rely=.5, anchor=tk.CENTER)
-        button2.place(relx=.5, rely=.6, anchor=tk.CENTER)
+        self.background_image_label = tk.Label(self, bd=0)
+        self.background_image_label.place(relx=.5, rely=.5, anchor='center')
+        CustomImage.load_async(self.background_image_label,
+                               url=LandingPage.background_url)
+
+        self.button_create_order = tk.Button(self, text="Buat Pesanan", width=30,
+                                             font=Style.font_large, command=self.create_order,
+                                             **Style.button_red, )
+        self.button_checkout = tk.Button(self, text="Selesai Gunakan Meja", width=30,
+                                         font=Style.font_large, command=self.checkout,
+                                         **Style.button_red, )
+        self.button_create_order.place(relx=.5, rely=.5, anchor=tk.CENTER)
+        self.button_checkout.place(relx=.5, rely=.6, anchor=tk.CENTER)
+
+    @Instrument.timed
+    def reset(self) -> None:
+        pass
+
+    def set_loading(self, loading: bool) -> None:
+        """Disable the buttons while the menu and tables are loading"""
+        state = tk.DISABLED if loading else tk.NORMAL
+        self.button_create_order.configure(
+            state=state, text="Memuat menu..." if loading else "Buat Pesanan")
+        self.button_checkout.configure(state=state)
 
     def create_order(self):
-        MainApp.show_page(CreateOrderPage(MainApp.container))
+        MainApp.show_page(MainApp.get_page(CreateOrderPage))
 
     def checkout(self):
-        MainApp.show_page(Checkout(MainApp.container))
+        MainApp.show_page(MainApp.get_page(Checkout))
 
 
 class CreateOrderPage(tk.Frame):
+    background_url = 'https://res.cloudinary.com/elhamdi/image/upload/v1670658201/nama_vvegdu.png'
+
+    @Instrument.timed
     def __init__(self, master=None):
         self.bg_color = '#ce7475'
         super().__init__(master, width=MainApp.window_width,
                          height=MainApp.window_height, bg=self.bg_color)
 
-        username = tk.StringVar()
-        order_list = [OrderedMenu(menu, 0)
-                      for menu in Menu.menu_list]
-        available_tables = Table.get_available()
-        # Give random available table
-        table_number = random.choice(
-            available_tables) if available_tables else -1
-        self.order = Order(table_number, username, order_list)
+        self.username = tk.StringVar()
+        self.order = self.create_order()
 
-        try:
-            self.background_image = CustomImage(
-                url='https://res.cloudinary.com/elhamdi/image/upload/v1670658201/nama_vvegdu.png').get_image()
-            background_image_label = tk.Label(
-                self, image=self.background_image)
-            background_image_label.place(relx=.5, rely=.5, anchor='center')
-        except:
-            pass
+        self.background_image_label = tk.Label(self, bd=0, bg=self.bg_color)
+        self.background_image_label.place(relx=.5, rely=.5, anchor='center')
+        CustomImage.load_async(self.background_image_label,
+                               url=CreateOrderPage.background_url)
 
         self.frame = tk.Frame(self, background=self.bg_color)
         self.frame.place(relx=.5, rely=.4, anchor=tk.CENTER)
@@ -266,7 +502,7 @@ class CreateOrderPage(tk.Frame):
             column=0, row=0, columnspan=2, sticky='nsew', pady=10)
 
         self.input_field = tk.Entry(
-            self.frame, textvariable=self.order.username, font=Style.font_large, justify='center')
+            self.frame, textvariable=self.username, font=Style.font_large, justify='center')
         self.input_field.bind('<Return>', self.display_menu)
         self.input_field.grid(
             column=0, row=1, columnspan=2, sticky='nsew', pady=10)
@@ -280,14 +516,42 @@ class CreateOrderPage(tk.Frame):
             self.frame, text="Lanjut", width=15, font=Style.font_large, **Style.button_red, command=self.display_menu)
         self.button_next.grid(column=1, row=2, pady=10)
 
+    def create_order(self) -> Order:
+        order = Order(-1, '')
+        self.reserve_table(order)
+        return order
+
+    def reserve_table(self, order: Order) -> None:
+        """Hold the order's table again if it is free, else a random one"""
+        reservation = None
+        if order.table_number in Table.all_tables:
+            reservation = Table.reserve(order.table_number)
+        reservation = reservation or Table.reserve()
+        if reservation:
+            order.table_number, order.hold = reservation
+        else:
+            order.hold = None
+
+    @Instrument.timed
+    def reset(self) -> None:
+        """Start a new order when the page is reused"""
+        if self.order.hold is not None:
+            Table.release(self.order.table_number, self.order.hold)
+        self.order = self.create_order()
+        self.username.set('')
+        self.input_field.focus_set()
+
     def display_menu(self, event: tk.Event = None) -> None:
         """Go to display menu page"""
         if not self.validate_username():
             return
+        self.order.username = self.username.get()
 
-        if Table.get_available():
-            MainApp.show_page(DisplayMenuPage(
-                MainApp.container, mode="order", order=self.order))
+        if not Table.has_hold(self.order.table_number, self.order.hold):
+            self.reserve_table(self.order)  # none yet, or expired
+        if self.order.hold is not None:
+            MainApp.show_page(MainApp.get_page(
+                DisplayMenuPage, mode="order", order=self.order))
         else:
             MainApp.clear()
             MainApp.show_toast(
@@ -295,38 +559,48 @@ class CreateOrderPage(tk.Frame):
 
     def validate_username(self) -> bool:
         """Username must be unique and not empty"""
-        if self.order.username.get() == '':
-            MainApp.show_toast('Nama tidak boleh kosong.')
+        error = OrderEngine.validate_username(self.username.get())
+        if error:
+            MainApp.show_toast(error)
             return False
-
-        booked_table = Table.get_booked()
-        for i in booked_table:
-            if self.order.username.get() == Table.all_tables[i].username.get():
-                MainApp.show_toast('Nama sudah dipakai.')
-                return False
         return True
 
 
 class DisplayMenuPage(tk.Frame):
+    background_url = 'https://res.cloudinary.com/elhamdi/image/upload/v1670665588/menu_a0yjvn.png'
+    virtual_threshold = 200  # menus larger than this use VirtualMenuTable
+    search_delay = 150  # ms without typing before searching
+    # Bindtags served by one class binding for every page and row
+    wheel_tag = 'MenuWheel'
+    quantity_tag = 'MenuQuantity'
+    sort_tag = 'MenuSort'
+    sortable_columns = {2: "price", 3: "additional_info"}  # table column -> Menu attribute
+    quantity_events = ("<<ComboboxSelected>>", "<FocusOut>", "<KeyRelease>")
+
+    @Instrument.timed
     def __init__(self, master, mode: Literal["order", "checkout"], order: Order):
         self.bg_color = '#ffcd7e'  # light orange
         self.order = order
         self.mode = mode
         super().__init__(master, width=MainApp.window_width,
                          height=MainApp.window_height, bg=self.bg_color)
-
-        try:
-            self.background_image = CustomImage(
-                url='https://res.cloudinary.com/elhamdi/image/upload/v1670665588/menu_a0yjvn.png').get_image()
-            background_image_label = tk.Label(
-                self, image=self.background_image)
-            background_image_label.place(relx=.5, rely=.5, anchor='center')
-        except:
-            pass
+        DisplayMenuPage.bind_delegates(self)
+        self.validate_command = (self.register(self.validate_input), '%P', '%S')
+        self.quantity_menu_ids = {}  # quantity widget path -> menu id
+        self.pending_quantities = {}  # quantity widget -> was focused out
+        self.pending_scroll = 0
+        self.update_after = None
+        self.sort_column = None  # Menu attribute, None for file order
+        self.sort_descending = False
+
+        self.background_image_label = tk.Label(self, bd=0, bg=self.bg_color)
+        self.background_image_label.place(relx=.5, rely=.5, anchor='center')
+        CustomImage.load_async(self.background_image_label,
+                               url=DisplayMenuPage.background_url)
 
         # Customer name
         self.label_name = ttk.Label(
-            self, text=f"Nama pemesan: \n{self.order.username.get()}", font=Style.font_base, background=self.bg_color)
+            self, text=f"Nama pemesan: \n{self.order.username}", font=Style.font_base, background=self.bg_color)
         self.label_name.place(relx=0.12, rely=0.12, anchor='nw')
 
         # Table number
@@ -359,22 +633,45 @@ class DisplayMenuPage(tk.Frame):
         self.category_menu_combobox.bind(
             "<<ComboboxSelected>>", self.change_category)
 
+        # Search by name or id
+        self.search_label = tk.Label(
+            self.category_menu_container, text="Cari :", bg=self.bg_color, font=Style.font_small_bold)
+        self.search_label.pack(side=tk.LEFT, padx=(20, 0))
+        self.search_query = tk.StringVar()
+        self.search_entry = ttk.Entry(
+            self.category_menu_container, textvariable=self.search_query, font=Style.font_small)
+        self.search_entry.pack(side=tk.LEFT)
+        self.search_result = None  # (query, positions) shown in the table
+        self.search_after = None
+        self.search_query.trace_add('write', self.schedule_search)
+
         # Scrollable table of menu
-        self.canvas = tk.Canvas(self.main_frame, width=740, height=300)
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar = ttk.Scrollbar(
-            self.main_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollbar.pack(side="right", fill="y")
-        self.menu_table = tk.Frame(self.canvas, bg=self.bg_color, bd=0)
-        self.menu_table.bind(
-            "<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.canvas.create_window((0, 0), window=self.menu_table, anchor='nw')
-        self.canvas.configure(
-            yscrollcommand=self.scrollbar.set, bg=self.bg_color, bd=0, highlightthickness=0,)
+        self.virtual = len(Menu.catalog) > DisplayMenuPage.virtual_threshold
+        if self.virtual:
+            self.menu_table = VirtualMenuTable(
+                self.main_frame, page=self, width=740, height=300)
+            self.menu_table.pack(side="left", fill="both", expand=True)
+            self.scrollbar = ttk.Scrollbar(
+                self.main_frame, orient="vertical", command=self.menu_table.yview)
+            self.scrollbar.pack(side="right", fill="y")
+            self.menu_table.scrollbar = self.scrollbar
+        else:
+            self.canvas = tk.Canvas(self.main_frame, width=740, height=300)
+            self.canvas.pack(side="left", fill="both", expand=True)
+            self.scrollbar = ttk.Scrollbar(
+                self.main_frame, orient="vertical", command=self.canvas.yview)
+            self.scrollbar.pack(side="right", fill="y")
+            self.menu_table = tk.Frame(self.canvas, bg=self.bg_color, bd=0)
+            self.menu_table.bind(
+                "<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+            self.canvas.create_window(
+                (0, 0), window=self.menu_table, anchor='nw')
+            self.canvas.configure(
+                yscrollcommand=self.scrollbar.set, bg=self.bg_color, bd=0, highlightthickness=0,)
 
         self.generate_all_tables()
-        self.bind_children(widget=self.main_frame, event="<MouseWheel>",
-                           callback=self.on_mouse_wheel)
+        self.add_bindtag(self.main_frame, DisplayMenuPage.wheel_tag)
+        MenuWatcher.subscribe(self.on_menu_change)
 
         # ================= main frame ====================
 
@@ -398,40 +695,145 @@ class DisplayMenuPage(tk.Frame):
             self.button_checkout.place(relx=0.8, rely=0.9, anchor='ne')
 
     def generate_all_tables(self) -> None:
-        categories = []
+        """Render the menu table
+
+        Without virtual scrolling, every category is rendered once into
+        its own frame. ALL shows the same frames together, so a quantity
+        has a single widget in every view, and show_tables() only packs
+        and hides what is already there.
+        """
+        if self.virtual:
+            self.menu_table.set_rows(self.get_virtual_rows())
+            return
+        for child in self.menu_table.winfo_children():
+            child.destroy()
+        self.quantity_menu_ids.clear()
+        self.category_tables = {}
+        self.row_tables = {}  # category -> grid of its rows
+        self.header_entries = {}
+        self.sort_headers = {}  # header widget path -> table column
+        self.menu_rows = {}
+        self.quantity_widgets = {}
+        for category in MenuCatalog.categories:
+            menus = Menu.catalog.get_category(category)
+            if menus:
+                self.category_tables[category] = self.generate_table(category, menus)
+        self.label_not_found = tk.Label(self.menu_table, bg=self.bg_color, font=Style.font_base,
+                                        text="Menu tidak ditemukan")
+        self.rendered_catalog = (Menu.catalog, Menu.catalog.version)
+        self.add_bindtag(self.menu_table, DisplayMenuPage.wheel_tag)
+        self.show_tables()
+
+    def get_shown_menus(self, category: str, all_menus: Sequence[Menu]) -> Sequence[Menu]:
+        """Menu of a category matching the search, in the sort order"""
+        catalog = Menu.catalog
+        found = None if self.search_result is None else self.search_result[1]
+        if self.sort_column is None:
+            if found is None:
+                return catalog.get_category(category)
+            return [menu for menu in map(all_menus.__getitem__, found)
+                    if menu.category == category]
+        positions = catalog.get_sort_order(category, self.sort_column)
+        if self.sort_descending:
+            positions = positions[::-1]
+        if found is not None:
+            found = set(found)
+            positions = [position for position in positions if position in found]
+        if isinstance(all_menus, MenuRows):
+            return MenuRows(catalog, positions)
+        return [all_menus[position] for position in positions]
+
+    def get_header(self, menu: Menu) -> list[str]:
+        """Column names of the table of menu's category"""
+        header = ["Kode", "Nama", "Harga", menu.additional_info_name, "Jumlah"]
+        for column, attribute in DisplayMenuPage.sortable_columns.items():
+            if attribute == self.sort_column:
+                header[column] += " ▼" if self.sort_descending else " ▲"
+        return header
+
+    def get_virtual_rows(self) -> TableRows:
+        active_category = self.category_menu_combobox.get()
+        all_menus = Menu.catalog.get_category("ALL")
+        rows = TableRows()
+        for category in MenuCatalog.categories:
+            if active_category not in ("ALL", category):
+                continue
+            menus = self.get_shown_menus(category, all_menus)
+            if not menus:
+                continue
+            rows.add(("title", category))
+            rows.add(("header", self.get_header(menus[0])))
+            rows.add_items(menus)
+        if not rows and self.search_result is not None:
+            rows.add(("title", "Menu tidak ditemukan"))
+        return rows
+
+    def show_tables(self) -> None:
+        """Show the rendered rows of the active category and search
+
+        Rows are only moved with grid and grid_remove, in the order of
+        get_shown_menus().
+        """
         active_category = self.category_menu_combobox.get()
-        if active_category in ("ALL", "MEALS"):
-            meals = [order for order in self.order.menu_list if isinstance(
-                order.menu, Meals)]
-            categories.append(meals)
-        if active_category in ("ALL", "DRINKS"):
-            drinks = [order for order in self.order.menu_list if isinstance(
-                order.menu, Drinks)]
-            categories.append(drinks)
-        if active_category in ("ALL", "SIDES"):
-            sides = [order for order in self.order.menu_list if isinstance(
-                order.menu, Sides)]
-            categories.append(sides)
-
-        for menu_list in categories:
-            self.generate_table(menu_list)
-
-    def generate_table(self, order_list: list[OrderedMenu]) -> None:
+        all_menus = Menu.catalog.get_category("ALL")
+        empty = True
+        for child in self.menu_table.pack_slaves():
+            child.pack_forget()
+        for category, table in self.category_tables.items():
+            if active_category not in ("ALL", category):
+                continue
+            shown = self.get_shown_menus(category, all_menus)
+            shown_ids = set()
+            for row, menu in enumerate(shown, start=1):
+                shown_ids.add(menu.id)
+                for column, widget in enumerate(self.menu_rows[menu.id]):
+                    widget.grid(row=row, column=column)
+            for menu in Menu.catalog.get_category(category):
+                if menu.id not in shown_ids:
+                    for widget in self.menu_rows[menu.id]:
+                        widget.grid_remove()
+            if shown:
+                for entry, text in zip(self.header_entries[category], self.get_header(shown[0])):
+                    self.set_entry_text(entry, text)
+                table.pack(fill='x')
+                empty = False
+        if empty and self.search_result is not None:
+            self.label_not_found.pack(anchor='w')
+
+    @staticmethod
+    def set_entry_text(entry: tk.Entry, text) -> None:
+        """Replace the text of a readonly entry"""
+        entry['state'] = 'normal'
+        entry.delete(0, tk.END)
+        entry.insert(tk.END, text)
+        entry['state'] = 'readonly'
+
+    def refresh_quantities(self) -> None:
+        """Show the quantities of the current order in rendered rows"""
+        for menu_id, widget in self.quantity_widgets.items():
+            quantity = self.order.get_quantity(menu_id)
+            if self.mode == "order":
+                widget.set(quantity)
+            else:
+                self.set_entry_text(widget, quantity)
+
+    def generate_table(self, category: str, menus: list[Menu]) -> tk.Frame:
         """Generate table per category"""
-        tk.Label(self.menu_table,
+        frame = tk.Frame(self.menu_table, bg=self.bg_color)
+        tk.Label(frame,
                  bg=self.bg_color,
                  font=Style.font_base,
-                 text=order_list[0].menu.__class__.__name__.upper()
+                 text=category
                  ).pack(anchor='w')
 
-        category_table = tk.Frame(self.menu_table, bg=self.bg_color)
+        category_table = tk.Frame(frame, bg=self.bg_color)
         category_table.pack(pady=(0, 10))
-        total_rows = len(order_list)
+        total_rows = len(menus)
         total_columns = 5
-        header = ["Kode", "Nama", "Harga",
-                  order_list[0].menu.additional_info_name, "Jumlah"]
+        header = self.get_header(menus[0])
 
         # Table header
+        self.header_entries[category] = []
         for i in range(total_columns):
             entry = tk.Entry(category_table,
                              font=Style.font_small_bold,
@@ -440,65 +842,241 @@ class DisplayMenuPage(tk.Frame):
             entry.grid(row=0, column=i)
             entry.insert(tk.END, header[i])
             entry['state'] = 'readonly'
+            self.header_entries[category].append(entry)
+            if i in DisplayMenuPage.sortable_columns:
+                entry['cursor'] = 'hand2'
+                self.add_bindtag(entry, DisplayMenuPage.sort_tag)
+                self.sort_headers[str(entry)] = i
 
         # Table data
+        self.row_tables[category] = category_table
         for i in range(total_rows):
-            ordered_menu = order_list[i]
-            ordered_menu_data = ordered_menu.menu.get_data()
-            ordered_menu_data[2] = self.dot(ordered_menu_data[2])
-
-            for j in range(total_columns-1):
-                entry = tk.Entry(category_table, font=Style.font_small,
-                                 relief="flat", readonlybackground=self.bg_color)
-                entry.grid(row=i+1, column=j)
-                entry.insert(tk.END, ordered_menu_data[j])
-                entry['state'] = 'readonly'
-
-            # Column jumlah
-            if self.mode == "order":
-                values = tuple(range(10))
-                opsi_jumlah = ttk.Combobox(
-                    category_table,
-                    font=Style.font_small,
-                    values=values,
-                    validate='key',
-                    validatecommand=(self.register(
-                        lambda x, y: self.validate_input(x, y)), '%P', '%S')
-                )
-                opsi_jumlah.grid(row=i+1, column=total_columns-1)
-                opsi_jumlah.insert(0, ordered_menu.quantity)
-                events = ("<<ComboboxSelected>>", "<FocusOut>", "<KeyRelease>")
-                for event in events:
-                    opsi_jumlah.bind(event,
-                                     lambda event, val=ordered_menu: self.change_menu_quantity(event, ordered_menu=val))
-                opsi_jumlah.unbind_class("TCombobox", "<MouseWheel>")
-            else:  # checkout mode
-                entry = tk.Entry(category_table, font=Style.font_small,
-                                 relief="flat", readonlybackground=self.bg_color)
-                entry.grid(row=i+1, column=total_columns-1)
-                entry.insert(tk.END, ordered_menu.quantity)
-                entry['state'] = 'readonly'
+            self.generate_row(category_table, i + 1, menus[i])
+        return frame
+
+    def generate_row(self, category_table: tk.Frame, row: int, menu: Menu) -> None:
+        """Generate the widgets of a menu at row of a category table"""
+        total_columns = 5
+        menu_data = menu.get_data()
+        menu_data[2] = self.dot(menu_data[2])
+        widgets = self.menu_rows[menu.id] = []
+
+        for j in range(total_columns-1):
+            entry = tk.Entry(category_table, font=Style.font_small,
+                             relief="flat", readonlybackground=self.bg_color)
+            entry.grid(row=row, column=j)
+            entry.insert(tk.END, menu_data[j])
+            entry['state'] = 'readonly'
+            widgets.append(entry)
+
+        # Column jumlah
+        if self.mode == "order":
+            values = tuple(range(10))
+            opsi_jumlah = ttk.Combobox(
+                category_table,
+                font=Style.font_small,
+                values=values,
+                validate='key',
+                validatecommand=self.validate_command
+            )
+            opsi_jumlah.grid(row=row, column=total_columns-1)
+            opsi_jumlah.insert(0, self.order.get_quantity(menu.id))
+            self.add_bindtag(opsi_jumlah, DisplayMenuPage.quantity_tag)
+            self.quantity_menu_ids[str(opsi_jumlah)] = menu.id
+            quantity_widget = opsi_jumlah
+        else:  # checkout mode
+            entry = tk.Entry(category_table, font=Style.font_small,
+                             relief="flat", readonlybackground=self.bg_color)
+            entry.grid(row=row, column=total_columns-1)
+            entry.insert(tk.END, self.order.get_quantity(menu.id))
+            entry['state'] = 'readonly'
+            quantity_widget = entry
+        widgets.append(quantity_widget)
+        self.quantity_widgets[menu.id] = quantity_widget
 
     def change_category(self, event: tk.Event = None) -> None:
         """Filter menu based on category"""
-        for child in self.menu_table.winfo_children():
-            child.destroy()
-        self.generate_all_tables()
-        self.bind_children(self.main_frame, '<MouseWheel>',
-                           self.on_mouse_wheel)
+        if self.virtual or self.rendered_catalog != (Menu.catalog, Menu.catalog.version):
+            self.generate_all_tables()
+        else:
+            self.show_tables()
+
+    def on_menu_change(self, added: list[str], removed: list[str], changed: list[str]) -> None:
+        """MenuWatcher listener, update the order and the affected rows"""
+        if self.pending_quantities:
+            self.apply_updates()  # edits of rows which may be removed
+        self.order.update_menus(removed + changed)
+        if self.search_result is not None:
+            query = self.search_result[0]
+            self.search_result = (query, Menu.catalog.search(query))
+        if self.virtual:
+            self.menu_table.set_rows(self.get_virtual_rows(), keep_offset=True)
+        else:
+            self.update_rows(added, removed, changed)
+        self.label_total_price['text'] = f"Total harga: Rp{self.dot(self.calculate_total_price())}"
 
-    def change_menu_quantity(self, event: tk.Event = None, ordered_menu: OrderedMenu = None, *args, **kwargs) -> None:
-        """Update quantity of ordered menu and total price"""
-        try:
-            value = event.widget.get()
-            ordered_menu.quantity = int(value) if value != '' else 0
+    def update_rows(self, added: list[str], removed: list[str], changed: list[str]) -> None:
+        """Destroy, create or refill the rendered rows of these menu
+
+        A menu moved to another category is created again in its new
+        table, other rows are only regridded by show_tables(), also when
+        the catalog was replaced, as its menu may be in another order.
+        """
+        catalog = Menu.catalog
+        replaced = self.rendered_catalog[0] is not catalog
+        created = list(added)
+        for menu_id in changed:
+            menu = catalog.get(menu_id)
+            widgets = self.menu_rows[menu_id]
+            if widgets[0].master is not self.row_tables.get(menu.category):
+                removed = removed + [menu_id]
+                created.append(menu_id)
+                continue
+            menu_data = menu.get_data()
+            menu_data[2] = self.dot(menu_data[2])
+            for entry, text in zip(widgets, menu_data):
+                self.set_entry_text(entry, text)
+        for menu_id in removed:
+            self.quantity_menu_ids.pop(str(self.quantity_widgets.pop(menu_id)), None)
+            for widget in self.menu_rows.pop(menu_id):
+                widget.destroy()
+
+        new_menus = {}
+        for menu_id in created:
+            menu = catalog.get(menu_id)
+            new_menus.setdefault(menu.category, []).append(menu)
+        for category, menus in new_menus.items():
+            category_table = self.row_tables.get(category)
+            if category_table is None:
+                self.category_tables[category] = self.generate_table(category, menus)
+                self.add_bindtag(self.category_tables[category], DisplayMenuPage.wheel_tag)
+                continue
+            for menu in menus:
+                self.generate_row(category_table, category_table.grid_size()[1], menu)
+                for widget in self.menu_rows[menu.id]:
+                    self.add_bindtag(widget, DisplayMenuPage.wheel_tag)
+        self.category_tables = {category: self.category_tables[category]
+                                for category in MenuCatalog.categories if category in self.category_tables}
+
+        self.rendered_catalog = (catalog, catalog.version)
+        if created or removed or replaced or self.sort_column or self.search_result is not None:
+            self.show_tables()
+
+    def schedule_search(self, *args) -> None:
+        """Search once typing pauses"""
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.search_after = self.after(
+            DisplayMenuPage.search_delay, self.search)
+
+    @Instrument.timed
+    def search(self) -> None:
+        """Filter menu by the words in the search box"""
+        self.search_after = None
+        query = self.search_query.get()
+        if query.split():
+            self.search_result = (
+                query, Menu.catalog.search(query, self.search_result))
+        elif self.search_result is None:
+            return
+        else:
+            self.search_result = None
+        self.change_category()
+
+    @staticmethod
+    def bind_delegates(widget: tk.Widget) -> None:
+        """Bind the shared bindtags once per Tk instance
+
+        The callbacks are registered on the toplevel, so they outlive
+        the page which bound them first.
+        """
+        root = widget.winfo_toplevel()
+        if root.bind_class(DisplayMenuPage.wheel_tag):
+            return
+        root.bind_class(DisplayMenuPage.wheel_tag, "<MouseWheel>",
+                        DisplayMenuPage.on_wheel_event)
+        for event in DisplayMenuPage.quantity_events:
+            root.bind_class(DisplayMenuPage.quantity_tag, event,
+                            DisplayMenuPage.on_quantity_event)
+        root.bind_class(DisplayMenuPage.sort_tag, "<Button-1>",
+                        DisplayMenuPage.on_sort_event)
+        root.unbind_class("TCombobox", "<MouseWheel>")
+
+    @staticmethod
+    def get_page(widget: tk.Widget | str) -> DisplayMenuPage | None:
+        """Page containing the widget of an event"""
+        while isinstance(widget, tk.Misc) and not isinstance(widget, DisplayMenuPage):
+            widget = widget.master
+        return widget if isinstance(widget, DisplayMenuPage) else None
+
+    @staticmethod
+    def on_wheel_event(event: tk.Event) -> None:
+        page = DisplayMenuPage.get_page(event.widget)
+        if page is not None:
+            page.pending_scroll += event.delta
+            page.schedule_update()
+
+    @staticmethod
+    def on_quantity_event(event: tk.Event) -> None:
+        page = DisplayMenuPage.get_page(event.widget)
+        if page is not None:
+            focus_out = event.type == tk.EventType.FocusOut
+            page.pending_quantities[event.widget] = \
+                page.pending_quantities.get(event.widget, False) or focus_out
+            page.schedule_update()
+
+    @staticmethod
+    def on_sort_event(event: tk.Event) -> None:
+        page = DisplayMenuPage.get_page(event.widget)
+        if page is None:
+            return
+        if page.virtual:
+            column = page.menu_table.get_header_column(event.widget)
+        else:
+            column = page.sort_headers.get(str(event.widget))
+        if column in DisplayMenuPage.sortable_columns:
+            page.sort_by(DisplayMenuPage.sortable_columns[column])
+
+    def sort_by(self, column: str) -> None:
+        """Cycle column through ascending, descending and file order"""
+        if self.sort_column != column:
+            self.sort_column, self.sort_descending = column, False
+        elif not self.sort_descending:
+            self.sort_descending = True
+        else:
+            self.sort_column = None
+        self.change_category()
+
+    def schedule_update(self) -> None:
+        """Apply queued quantity and scroll events once the burst is over"""
+        if self.update_after is None:
+            self.update_after = self.after_idle(self.apply_updates)
+
+    @Instrument.timed
+    def apply_updates(self) -> None:
+        self.update_after = None
+        if self.pending_quantities:
+            pending, self.pending_quantities = self.pending_quantities, {}
+            for widget, focus_out in pending.items():
+                self.change_menu_quantity(widget, focus_out)
             self.label_total_price['text'] = f"Total harga: Rp{self.dot(self.calculate_total_price())}"
-            # Change empty string to 0 in input text on FocusOut event
-            if event.type != '10' and value == '':
-                return
-            event.widget.set(ordered_menu.quantity)
-        except:
-            pass
+        if self.pending_scroll:
+            units = int(-1*(self.pending_scroll/120))
+            self.pending_scroll = 0
+            view = self.menu_table if self.virtual else self.canvas
+            view.yview_scroll(units, 'units')
+
+    def change_menu_quantity(self, widget: ttk.Combobox, focus_out: bool = False) -> None:
+        """Update quantity of the ordered menu of a quantity combobox"""
+        menu_id = self.quantity_menu_ids.get(str(widget))
+        if menu_id not in Menu.catalog or not widget.winfo_exists():
+            return  # removed by MenuWatcher
+        ordered_menu = self.order.get_ordered_menu(menu_id)
+        value = widget.get()
+        self.order.set_quantity(ordered_menu, int(value) if value != '' else 0)
+        # Change empty string to 0 in input text on FocusOut event
+        if focus_out or value != '':
+            widget.set(ordered_menu.quantity)
 
     def validate_input(self, value_if_allowed, text) -> bool:
         """Ensure input is only number"""
@@ -511,46 +1089,67 @@ class DisplayMenuPage(tk.Frame):
             return False
 
     def calculate_total_price(self) -> int:
-        total = 0
-        for order in self.order.menu_list:
-            total += order.quantity * order.menu.price
-        return total
+        return self.order.get_total_price()
+
+    @Instrument.timed
+    def reset(self, mode: Literal["order", "checkout"], order: Order) -> None:
+        """Rebind pooled page to another order"""
+        self.order = order
+        self.label_name['text'] = f"Nama pemesan: \n{self.order.username}"
+        self.category_menu_combobox.set("ALL")
+        self.sort_column = None
+        self.search_query.set('')
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+            self.search_after = None
+        self.search_result = None
+        self.change_category()
+        if not self.virtual:
+            self.refresh_quantities()
+            self.canvas.yview_moveto(0)
+        self.label_total_price['text'] = f"Total harga: Rp{self.dot(self.calculate_total_price())}"
 
     def change_table(self) -> None:
         """UBAH MEJA"""
-        MainApp.show_page(TableDisplayPage(
-            MainApp.container, mode="order", order=self.order))
+        MainApp.show_page(MainApp.get_page(
+            TableDisplayPage, mode="order", order=self.order))
 
-    def bind_children(self, widget: tk.Widget, event: str, callback) -> None:
-        """Bind event to it's children recursively"""
-        children = widget.winfo_children()
-        if len(children) == 0:
-            return
-        for child in children:
-            child.bind(event, callback)
-            self.bind_children(child, event, callback)
+    def add_bindtag(self, widget: tk.Widget, tag: str) -> None:
+        """Add tag to the bindtags of widget and it's children recursively"""
+        tags = widget.bindtags()
+        if tag not in tags:
+            widget.bindtags(tags[:1] + (tag,) + tags[1:])
+        for child in widget.winfo_children():
+            self.add_bindtag(child, tag)
 
     def book(self) -> None:
         """Finish creating order"""
-        Table.book(table_number=self.order.table_number,
-                   order=self.order)
+        try:
+            OrderEngine.book(self.order)
+        except (ValueError, ConnectionError) as error:
+            MainApp.show_toast(str(error))
+            return
         MainApp.clear()
         MainApp.show_toast("Berhasil membuat pesanan!")
 
     def checkout(self) -> None:
         """SELESAI MENGGUNAKAN MEJA"""
-        Table.checkout(self.order.table_number)
+        try:
+            OrderEngine.checkout(self.order.table_number)
+        except (ValueError, ConnectionError) as error:
+            MainApp.show_toast(str(error))
+            return
         MainApp.back()
         MainApp.show_toast("Berhasil melakukan checkout!")
 
-    def on_mouse_wheel(self, event: tk.Event) -> None:
-        """Table scrolling effect"""
-        self.canvas.yview_scroll(int(-1*(event.delta/120)), 'units')
-
     def dot(self, num: int) -> str:
         """Separate thousand integer with dot"""
         return f"{num:,}".replace(',', '.')
 
+    def destroy(self) -> None:
+        MenuWatcher.unsubscribe(self.on_menu_change)
+        super().destroy()
+
     def pack(self) -> None:
         """Update table number label while repacking"""
         self.label_table_number['text'] = f"No Meja: {self.order.table_number}"
@@ -558,24 +1157,176 @@ class DisplayMenuPage(tk.Frame):
         super().pack_propagate(False)
 
 
+class TableRows(Sequence):
+    """Rows of a VirtualMenuTable
+
+    add_items() appends a whole sequence of menu, which is only turned
+    into ("item", menu) rows when they are shown.
+    """
+
+    def __init__(self) -> None:
+        self.starts = []  # first row index of every part
+        self.parts = []  # (row or menu sequence, is menu sequence)
+        self.length = 0
+
+    def add(self, row: tuple) -> None:
+        self.starts.append(self.length)
+        self.parts.append((row, False))
+        self.length += 1
+
+    def add_items(self, menus: Sequence[Menu]) -> None:
+        self.starts.append(self.length)
+        self.parts.append((menus, True))
+        self.length += len(menus)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> tuple:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        part = bisect.bisect_right(self.starts, index) - 1
+        value, is_items = self.parts[part]
+        return ("item", value[index - self.starts[part]]) if is_items else value
+
+
+class VirtualMenuTable(tk.Frame):
+    """Menu table which only creates the rows that fit in its viewport
+
+    Rows are ("title", category), ("header", columns) or
+    ("item", Menu), whose ordered quantity is looked up when shown.
+    Scrolling rebinds the same row widgets to other rows, so the widget
+    count does not depend on the menu size.
+    """
+
+    def __init__(self, master, page: 'DisplayMenuPage', width: int, height: int) -> None:
+        super().__init__(master, width=width, height=height, bg=page.bg_color)
+        self.grid_propagate(False)
+        self.page = page
+        self.rows = []
+        self.offset = 0
+        self.scrollbar = None
+        row_height = Style.font_small.metrics('linespace') + 8
+        self.visible_rows = -(-height // row_height)
+        self.row_widgets = [self.create_row(i)
+                            for i in range(self.visible_rows)]
+
+    def create_row(self, row: int) -> dict:
+        widgets = {'cells': []}
+        for column in range(5):
+            entry = tk.Entry(self, font=Style.font_small, relief="flat",
+                             readonlybackground=self.page.bg_color, state='readonly')
+            entry.grid(row=row, column=column)
+            if column in DisplayMenuPage.sortable_columns:
+                self.page.add_bindtag(entry, DisplayMenuPage.sort_tag)
+            widgets['cells'].append(entry)
+
+        if self.page.mode == "order":
+            opsi_jumlah = ttk.Combobox(
+                self,
+                font=Style.font_small,
+                values=tuple(range(10)),
+                validate='key',
+                validatecommand=self.page.validate_command
+            )
+            opsi_jumlah.grid(row=row, column=4)
+            self.page.add_bindtag(opsi_jumlah, DisplayMenuPage.quantity_tag)
+            widgets['quantity'] = opsi_jumlah
+        return widgets
+
+    def get_header_column(self, widget: tk.Widget) -> int | None:
+        """Column of widget if it is a cell of a shown header row"""
+        for i, widgets in enumerate(self.row_widgets):
+            if widget in widgets['cells']:
+                index = self.offset + i
+                if index < len(self.rows) and self.rows[index][0] == "header":
+                    return widgets['cells'].index(widget)
+                return None
+        return None
+
+    def set_rows(self, rows: Sequence[tuple], keep_offset: bool = False) -> None:
+        self.rows = rows
+        self.scroll_to(self.offset if keep_offset else 0)
+
+    def yview(self, *args) -> None:
+        """Scrollbar command"""
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1]) * len(self.rows)))
+        else:
+            self.yview_scroll(int(args[1]), args[2])
+
+    def yview_scroll(self, number: int, what: str) -> None:
+        if what == 'pages':
+            number *= self.visible_rows - 1
+        self.scroll_to(self.offset + number)
+
+    def scroll_to(self, offset: int) -> None:
+        self.offset = max(0, min(offset, len(self.rows) - self.visible_rows))
+        for i, widgets in enumerate(self.row_widgets):
+            index = self.offset + i
+            self.show_row(widgets, self.rows[index]
+                          if index < len(self.rows) else None)
+        if self.scrollbar:
+            total = max(len(self.rows), 1)
+            self.scrollbar.set(self.offset / total,
+                               min(self.offset + self.visible_rows, total) / total)
+
+    def show_row(self, widgets: dict, row: tuple | None) -> None:
+        """Rebind row widgets to another row"""
+        kind, value = row if row else (None, None)
+        quantity = widgets.get('quantity')
+
+        if kind == "title":
+            texts, font = [value, '', '', '', ''], Style.font_base
+        elif kind == "header":
+            texts, font = value, Style.font_small_bold
+        elif kind == "item":
+            texts, font = value.get_data() + [self.page.order.get_quantity(value.id)], Style.font_small
+            texts[2] = self.page.dot(texts[2])
+        else:
+            texts, font = [''] * 5, Style.font_small
+
+        for entry, text in zip(widgets['cells'], texts):
+            entry['state'] = 'normal'
+            entry['font'] = font
+            entry.delete(0, tk.END)
+            entry.insert(tk.END, text)
+            entry['state'] = 'readonly'
+
+        if quantity is not None:
+            if kind == "item":
+                # Flush an edit of the menu this widget showed before
+                if quantity in self.page.pending_quantities:
+                    self.page.apply_updates()
+                self.page.quantity_menu_ids[str(quantity)] = value.id
+                widgets['cells'][4].grid_remove()
+                quantity.set(self.page.order.get_quantity(value.id))
+                quantity.grid()
+            else:
+                quantity.grid_remove()
+                widgets['cells'][4].grid()
+
+
 class TableDisplayPage(tk.Frame):
+    background_url = 'https://res.cloudinary.com/elhamdi/image/upload/v1670679681/table_cgbpoe.png'
+    columns = None  # floor plan columns, None for 2 up to 10 tables else 8
+    max_visible_rows = 5
+
+    @Instrument.timed
     def __init__(self, master, mode: Literal["order", "checkout"], order: Order = None):
         self.mode = mode
         self.order = order
-        self.available_tables = Table.get_available()
         self.selected_table = order.table_number if order else None
         self.bg_color = '#ffc4a4'  # light orange
         super().__init__(master, width=MainApp.window_width,
                          height=MainApp.window_height, bg=self.bg_color)
 
-        try:
-            self.background_image = CustomImage(
-                url='https://res.cloudinary.com/elhamdi/image/upload/v1670679681/table_cgbpoe.png').get_image()
-            background_image_label = tk.Label(
-                self, image=self.background_image)
-            background_image_label.place(relx=.5, rely=.5, anchor='center')
-        except:
-            pass
+        self.background_image_label = tk.Label(self, bd=0, bg=self.bg_color)
+        self.background_image_label.place(relx=.5, rely=.5, anchor='center')
+        CustomImage.load_async(self.background_image_label,
+                               url=TableDisplayPage.background_url)
 
         self.frame = tk.Frame(self, bg=self.bg_color)
         self.frame.place(relx=.5, rely=.21, anchor='n')
@@ -587,24 +1338,24 @@ class TableDisplayPage(tk.Frame):
             self.frame, text=text_label_title, bg=self.bg_color, font=Style.font_base)
         self.label_title.pack()
 
+        # Floor plan, one rectangle per table
         self.container_tables = tk.Frame(self.frame, bg=self.bg_color)
-        self.container_tables.pack()
-        self.button_tables = {}
-        table_numbers = list(Table.all_tables.keys())
-        half = len(table_numbers)//2
-        for col in range(2):
-            for row in range(half):
-                curr_table_number = table_numbers[col*half+row]
-                self.button_tables[curr_table_number] = tk.Button(
-                    self.container_tables,
-                    text=curr_table_number,
-                    width=15, padx=10, pady=5,
-                    font=Style.font_large,
-                    **Style.button,
-                    command=lambda i=curr_table_number: self.click_table_number(i))
-                self.button_tables[curr_table_number].grid(
-                    row=row, column=col, sticky='nsew', padx=5, pady=5)
-        self.update_button_style()
+        self.container_tables.pack(pady=5)
+        self.canvas = tk.Canvas(self.container_tables, bg=self.bg_color,
+                                bd=0, highlightthickness=0, cursor='hand2')
+        self.canvas.pack(side=tk.LEFT)
+        self.scrollbar = ttk.Scrollbar(
+            self.container_tables, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.tag_bind("table", "<Button-1>", self.on_click_canvas)
+        self.canvas.tag_bind("table", "<Enter>", self.on_hover_canvas)
+        self.canvas.tag_bind("table", "<Leave>", self.on_hover_canvas)
+        self.canvas.bind("<MouseWheel>", lambda event: self.canvas.yview_scroll(
+            int(-1*(event.delta/120)), 'units'))
+        self.hovered_table = None
+        self.dirty_tables = set()
+        self.draw_floor_plan()
+        Table.subscribe(self.on_table_change)
 
         self.container_info = tk.Frame(self.frame, bg=self.bg_color)
         self.container_info.pack(fill=tk.BOTH, expand=True)
@@ -626,38 +1377,128 @@ class TableDisplayPage(tk.Frame):
             tk.Button(self.container_navigation, text="OK", width=15, padx=5, pady=5, font=Style.font_large, **Style.button_red,
                       command=self.click_ok).grid(row=0, column=1, sticky='w', padx=5)
 
+    def draw_floor_plan(self) -> None:
+        """Draw tables column by column"""
+        table_numbers = list(Table.all_tables)
+        columns = TableDisplayPage.columns or (
+            2 if len(table_numbers) <= 10 else 8)
+        rows = max(-(-len(table_numbers) // columns), 1)
+        gap = 10
+        cell_width = min(200, 860 // columns - gap)
+        cell_height = 44
+
+        self.table_items = {}
+        for i, table_number in enumerate(table_numbers):
+            column, row = divmod(i, rows)
+            x = column * (cell_width + gap)
+            y = row * (cell_height + gap)
+            tags = ("table", f"table-{table_number}")
+            self.table_items[table_number] = self.canvas.create_rectangle(
+                x, y, x + cell_width, y + cell_height, width=0, tags=tags)
+            self.canvas.create_text(x + cell_width/2, y + cell_height/2, text=table_number,
+                                    fill=Style.button['fg'], font=Style.font_large, tags=tags)
+
+        visible_rows = min(rows, TableDisplayPage.max_visible_rows)
+        self.canvas.configure(width=columns * (cell_width + gap) - gap,
+                              height=visible_rows * (cell_height + gap) - gap,
+                              scrollregion=(0, 0, columns * (cell_width + gap) - gap,
+                                            rows * (cell_height + gap) - gap))
+        if rows > visible_rows:
+            self.scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.update_button_style()
+
+    def get_table_at_pointer(self) -> int | None:
+        for tag in self.canvas.gettags("current"):
+            if tag.startswith("table-"):
+                return int(tag[len("table-"):])
+        return None
+
+    def on_click_canvas(self, event: tk.Event) -> None:
+        table_number = self.get_table_at_pointer()
+        if table_number is not None:
+            self.click_table_number(table_number)
+
+    def on_hover_canvas(self, event: tk.Event) -> None:
+        """Use active color for the table under the pointer"""
+        previous_table = self.hovered_table
+        self.hovered_table = self.get_table_at_pointer() \
+            if event.type == tk.EventType.Enter else None
+        self.update_button_style(
+            [previous_table, self.hovered_table])
+
+    def on_table_change(self, event: str, table_number: int, menu_id: str = None) -> None:
+        """Table listener, recolor changed tables once the app is idle"""
+        if not self.dirty_tables:
+            self.after_idle(self.redraw_dirty_tables)
+        self.dirty_tables.add(table_number)
+
+    def redraw_dirty_tables(self) -> None:
+        dirty_tables, self.dirty_tables = self.dirty_tables, set()
+        self.update_button_style(dirty_tables)
+
+    @Instrument.timed
+    def reset(self, mode: Literal["order", "checkout"], order: Order = None) -> None:
+        """Rebind pooled page to another order"""
+        previous_table = self.selected_table
+        self.order = order
+        self.selected_table = order.table_number if order else None
+        self.update_button_style([previous_table, self.selected_table])
+
+    def destroy(self) -> None:
+        Table.unsubscribe(self.on_table_change)
+        super().destroy()
+
     def click_ok(self) -> None:
-        """Update table number in the order"""
-        self.order.table_number = self.selected_table
+        """Move the order's hold to the selected table"""
+        if (self.selected_table != self.order.table_number
+                or not Table.has_hold(self.order.table_number, self.order.hold)):
+            reservation = Table.reserve(self.selected_table)
+            if reservation is None:
+                MainApp.show_toast("Meja telah terisi!")
+                return
+            if self.order.hold is not None:
+                Table.release(self.order.table_number, self.order.hold)
+            self.order.table_number, self.order.hold = reservation
         MainApp.back()
 
+    @Instrument.timed
     def click_table_number(self, table_number) -> None:
         """ Order mode: Click on available table to select table
             Checkout mode: Click on booked table to checkout
         """
         if self.mode == "order":
-            if table_number in self.available_tables:
+            if Table.is_available(table_number) or table_number == self.order.table_number:
+                previous_table = self.selected_table
                 self.selected_table = table_number
-                self.update_button_style()
+                self.update_button_style([previous_table, table_number])
             else:
                 MainApp.show_toast("Meja telah terisi!")
 
         if self.mode == "checkout":
-            if table_number not in self.available_tables:
-                MainApp.show_page(DisplayMenuPage(MainApp.container,
-                                                  "checkout", Table.all_tables[table_number]))
+            if Table.all_tables[table_number] is not None:
+                MainApp.show_page(MainApp.get_page(
+                    DisplayMenuPage, mode="checkout", order=Table.all_tables[table_number]))
             else:
                 MainApp.show_toast("Meja ini kosong!")
 
-    def update_button_style(self) -> None:
-        """Update button color.
+    def update_button_style(self, table_numbers=None) -> None:
+        """Update table color, all tables if table_numbers is None.
 
             Green: available
-            Purple: booked
+            Purple: booked (held too in order mode)
             Blue: selected
         """
-        for key, button in self.button_tables.items():
-            if key in Table.get_available():
+        if table_numbers is None:
+            table_numbers = self.table_items
+        for key in table_numbers:
+            if key not in self.table_items:
+                continue
+            if self.mode == "checkout":
+                # Held tables have no order to check out yet
+                available = Table.all_tables[key] is None
+            else:
+                available = Table.is_available(key) or (self.order and key == self.order.table_number)
+            if available:
                 bg_color = Style.button_green['bg']
                 active_bg_color = Style.button_green['activebackground']
             else:
@@ -667,12 +1508,10 @@ class TableDisplayPage(tk.Frame):
                 if key == self.selected_table:
                     bg_color = Style.button_blue['bg']
                     active_bg_color = Style.button_blue['activebackground']
-            button['background'] = bg_color
-            button['activebackground'] = active_bg_color
+            self.canvas.itemconfigure(self.table_items[key],
+                                      fill=active_bg_color if key == self.hovered_table else bg_color)
 
     def pack(self) -> None:
-        self.available_tables = Table.get_available()
-        self.update_button_style()
         super().pack(fill=None, expand=False)
         super().pack_propagate(0)
 
@@ -682,36 +1521,105 @@ class Checkout():
         self.table_display = TableDisplayPage(master, mode='checkout')
         self.table_display.pack()
 
+    @Instrument.timed
+    def reset(self) -> None:
+        self.table_display.reset(mode='checkout')
+
     def pack(self) -> None:
         self.table_display.pack()
 
     def pack_forget(self) -> None:
         self.table_display.pack_forget()
 
-
-def fetch_menu():
-    """Fetch menu from 'menu.txt'"""
-    with open('menu.txt') as file:
-        for line in file.readlines():
-            # Menu type
-            if line.startswith("==="):
-                menu_type = line.replace("===", '', 1).strip()
-                continue
-            # Menu data
-            menu_data = line.split(';')
-            menu_data[2], menu_data[3] = int(menu_data[2]), int(
-                menu_data[3])  # price, additional_info
-
-            match menu_type:
-                case "MEALS":  Meals(*menu_data)
-                case "DRINKS":  Drinks(*menu_data)
-                case "SIDES":  Sides(*menu_data)
+    def destroy(self) -> None:
+        self.table_display.destroy()
 
 
 def main():
-    fetch_menu()
+    StartupProfiler.mark('import modules')
+    parser = build_parser()
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print how long each startup step takes")
+    parser.add_argument('--connect', metavar='ADDRESS',
+                        help="use the table state of the server on ADDRESS")
+    args = parser.parse_args()
+    if args.connect and args.state_dir:
+        parser.error("--state-dir is kept by the server, not with --connect")
+    if args.connect and (args.sales_report or args.export_sales):
+        parser.error("the sales history is kept by the server, not with --connect")
+    if is_headless(args):
+        run_headless(args, parser)
+        return
+    StartupProfiler.enabled = args.profile_startup
+    # Kept with the table state, --connect and --state-dir are exclusive
+    sales = SalesHistory(os.path.join(args.state_dir, 'sales.csv')) if args.state_dir else None
+    Table.setup(args.tables)
+    StartupProfiler.mark('setup tables')
+    journal = Journal(args.state_dir) if args.state_dir else None
+
     app = MainApp()
-    app.mainloop()
+    StartupProfiler.mark('create window')
+    app.update()  # show the window before loading the menu
+    StartupProfiler.mark('first draw')
+    menu_watcher = MenuWatcher(columnar=args.columnar)  # before loading, so no change is missed
+
+    # The menu is loaded on a worker thread, the window stays responsive
+    from concurrent.futures import ThreadPoolExecutor
+    menu_loader = ThreadPoolExecutor(1, thread_name_prefix='menu')
+    menu_future = menu_loader.submit(load_menu, columnar=args.columnar)
+    landing_page = MainApp.page_stack[0]
+    landing_page.set_loading(True)
+
+    def watch_menu() -> None:
+        menu_watcher.poll_in_background(menu_loader)
+        # Check a running reload soon, it is applied on this thread
+        interval = .05 if menu_watcher.pending else menu_watcher.interval
+        app.after(int(interval * 1000), watch_menu)
+
+    def apply_pushed() -> None:
+        OrderEngine.client.apply_pushed()
+        app.after(100, apply_pushed)
+
+    def sync_journal() -> None:
+        journal.sync_if_due()
+        app.after(int(journal.sync_interval * 1000), sync_journal)
+
+    def install_menu() -> None:
+        """Restore tables once the menu is loaded, their orders need it"""
+        if not menu_future.done():
+            app.after(50, install_menu)
+            return
+        try:
+            Menu.catalog, _ = menu_future.result()
+            StartupProfiler.mark('load menu')
+            watch_menu()
+            if args.connect:
+                OrderEngine.client = TableClient(args.connect)
+                OrderEngine.client.connect()
+                StartupProfiler.mark('connect to server')
+                apply_pushed()
+        except OSError as error:
+            print(f"Failed to start: {error}")
+            app.destroy()
+            return
+        if journal:
+            journal.open()
+            StartupProfiler.mark('restore tables')
+            sync_journal()
+        if sales:
+            sales.open()
+            journal.synced_with.append(sales.sync)  # both are kept in --state-dir
+        landing_page.set_loading(False)
+        StartupProfiler.report()
+    app.after(50, install_menu)
+    try:
+        app.mainloop()
+    finally:
+        if journal:
+            journal.close()
+        if sales:
+            sales.close()
+        Instrument.dump()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,498 @@
+"""Benchmarks for the hot paths of the kafe app
+
+Usage: python benchmark.py [--scales 1000 10000 100000]
+                            [--load-scales 1000 100000 1000000] [--output FILE]
+
+Synthetic menus and table states are generated for every scale, menu
+loading is measured, with its peak memory, at the load scales. Images
+are served by a local HTTP stand-in. Order engine cases only need
+order_engine.py. GUI and image cases need tkinter and Pillow, and GUI
+cases a display; without $DISPLAY they run under Xvfb when it is
+installed, otherwise they are skipped. Results are written as JSON so
+runs can be compared.
+"""
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import order_engine as engine
+try:
+    import C_JSK_2206081194_IlhamAbdillahAlhamdi_TP04 as kafe
+except ImportError:
+    kafe = None  # no tkinter or Pillow, window and image cases are skipped
+
+
+def generate_menu(path: str, number_of_items: int) -> None:
+    """Write menu.txt with number_of_items spread over the categories"""
+    prefixes = {"MEALS": "M", "DRINKS": "D", "SIDES": "T"}
+    per_category = max(number_of_items // len(prefixes), 1)
+    with open(path, 'w', encoding='utf-8') as file:
+        for category, prefix in prefixes.items():
+            file.write(f"==={category}\n")
+            for i in range(per_category):
+                file.write(f"{prefix}{i:07d};{category.title()} {i};"
+                           f"{random.randint(5, 80) * 1000};{random.randint(1, 5)}\n")
+
+
+def generate_tables(number_of_tables: int, booked_ratio: float = .5) -> None:
+    """Setup tables and book part of them with small orders"""
+    engine.Table.setup(number_of_tables)
+    menu_ids = [menu.id for menu in engine.Menu.catalog.get_category("ALL")[:50]]
+    for table_number in range(1, number_of_tables + 1):
+        if random.random() < booked_ratio:
+            order = engine.Order(table_number, f"customer {table_number}")
+            for menu_id in random.sample(menu_ids, min(3, len(menu_ids))):
+                engine.OrderEngine.set_quantity(order, menu_id, 2)
+            engine.Table.book(table_number, order)
+
+
+def trace_memory(function) -> dict:
+    """Bytes traced while running function: still held after it, and the peak
+
+    The result of function is kept until the bytes are read.
+    """
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+        del result  # held until here, so what function built is counted
+    finally:
+        tracemalloc.stop()
+    return {'bytes': current - start, 'peak_bytes': peak - start}
+
+
+def measure(function, repeat: int) -> dict:
+    """Run function repeat times, return timing summary in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings),
+            'max': max(timings), 'repeat': repeat}
+
+
+class ImageServer:
+    """Local HTTP stand-in serving one generated background per path"""
+
+    def __init__(self, size: tuple[int] = (2048, 1152)) -> None:
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 64).convert('RGB').save(buffer, 'JPEG')
+        data = buffer.getvalue()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/{name}.jpg"
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+def bench_fetch_menu(path: str, repeat: int) -> dict:
+    """Parse and cache load time and memory, with Menu objects and with columns
+
+    The object catalog cache still makes one Menu per row on load, only
+    the columnar cache skips most per-row work.
+    """
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for suffix, columnar in (('', False), ('_columnar', True)):
+            results[f'fetch_menu_parse{suffix}'] = measure(
+                lambda: engine.load_menu(path, use_cache=False, columnar=columnar), repeat)
+            engine.load_menu(path, columnar=columnar)  # write the cache
+            results[f'fetch_menu_cached{suffix}'] = measure(
+                lambda: engine.load_menu(path, columnar=columnar), repeat)
+            for case, use_cache in (('parse', False), ('cached', True)):
+                results[f'fetch_menu_{case}{suffix}_memory'] = trace_memory(
+                    lambda: engine.load_menu(path, use_cache, columnar))
+        # The index is built by fetch_menu, the first search only looks it up
+        engine.fetch_menu(path, columnar=True)
+        results['search_first_query_columnar'] = measure(
+            lambda: engine.Menu.catalog.search("meals 1"), 1)
+        engine.fetch_menu(path)
+    return results
+
+
+def bench_reprice(path: str, repeat: int) -> dict:
+    """Raise DRINKS by 10% with Menu objects and with columns"""
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, columnar in (('reprice_drinks', False), ('reprice_drinks_columnar', True)):
+            engine.fetch_menu(path, columnar=columnar)
+            results[name] = measure(
+                lambda: engine.Menu.catalog.reprice("DRINKS", 10), repeat)
+        engine.fetch_menu(path)
+    return results
+
+
+def bench_menu_reload(path: str, repeat: int) -> dict:
+    """Change one price in the file, then apply it with MenuWatcher"""
+    with open(path, encoding='utf-8') as file:
+        lines = file.readlines()
+    prices = iter(range(1000, 10**9, 1000))
+
+    def change_price():
+        fields = lines[1].split(';')
+        fields[2] = str(next(prices))
+        lines[1] = ';'.join(fields)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        watcher.reload()
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.fetch_menu(path, use_cache=False)
+        watcher = engine.MenuWatcher(path)
+        results = {'menu_reload_price_change': measure(change_price, repeat)}
+        engine.fetch_menu(path)
+    return results
+
+
+def bench_order(repeat: int) -> dict:
+    order = engine.Order(1, 'benchmark')
+    menus = engine.Menu.catalog.get_category("ALL")
+    for menu in random.sample(menus, min(20, len(menus))):
+        order.set_quantity(order.get_ordered_menu(menu.id), 1)
+
+    def change_quantities():
+        for menu in menus[:1000]:
+            order.set_quantity(order.get_ordered_menu(menu.id), 3)
+            order.set_quantity(order.get_ordered_menu(menu.id), 0)
+    return {
+        'calculate_total_price': measure(order.get_total_price, repeat),
+        'set_quantity_x2000': measure(change_quantities, repeat),
+    }
+
+
+def bench_journal(number_of_tables: int, work_dir: str, repeat: int) -> dict:
+    """Book and checkout every table with and without a Journal, then recover it"""
+    menu_ids = [menu.id for menu in engine.Menu.catalog.get_category("ALL")[:50]]
+
+    def book_and_checkout():
+        for table_number in range(1, number_of_tables + 1):
+            order = engine.Order(table_number, f"customer {table_number}")
+            for menu_id in menu_ids[:3]:
+                engine.OrderEngine.set_quantity(order, menu_id, 2)
+            engine.OrderEngine.book(order)
+        for table_number in range(1, number_of_tables + 1):
+            engine.OrderEngine.checkout(table_number)
+
+    def book_and_checkout_journaled():
+        journal = engine.Journal(tempfile.mkdtemp(dir=work_dir))
+        journal.open()
+        try:
+            book_and_checkout()
+        finally:
+            journal.close()
+
+    engine.Table.setup(number_of_tables)
+    results = {
+        'book_checkout_all_tables': measure(book_and_checkout, repeat),
+        'book_checkout_all_tables_journal': measure(book_and_checkout_journaled, repeat),
+    }
+
+    # Every table booked with 3 menu, replayed from the journal alone or
+    # loaded from a snapshot
+    for case, take_snapshot in (('journal_recover_replay', False),
+                                ('journal_recover_snapshot', True)):
+        state_dir = tempfile.mkdtemp(dir=work_dir)
+        journal = engine.Journal(state_dir, snapshot_every=10**9)
+        journal.open()
+        generate_tables(number_of_tables, booked_ratio=1)
+        if take_snapshot:
+            journal.snapshot()
+        journal.close()
+
+        def recover():
+            engine.Table.setup(number_of_tables)
+            recovered = engine.Journal(state_dir, snapshot_every=10**9)
+            recovered.open()
+            recovered.close()
+        results[case] = measure(recover, repeat)
+    engine.Table.setup(number_of_tables)
+    return results
+
+
+def bench_booking_contention(number_of_tables: int, work_dir: str, repeat: int,
+                             threads: int = 16, attempts: int = 500) -> dict:
+    """Book, change and checkout tables from many threads at once
+
+    Holds are sometimes released or left to expire before booking. A
+    Table listener fails the run when a booked table is booked again.
+    """
+    menu_ids = [menu.id for menu in engine.Menu.catalog.get_category("ALL")[:50]]
+
+    def run():
+        engine.Table.setup(number_of_tables)
+        journal_dir = tempfile.mkdtemp(dir=work_dir)
+        journal = engine.Journal(journal_dir, snapshot_every=500)
+        journal.open()
+        booked, double_bookings, errors = set(), [], []
+
+        def on_table_change(event, table_number, menu_id=None):
+            if event == "book":
+                if table_number in booked:
+                    double_bookings.append(table_number)
+                booked.add(table_number)
+            elif event == "checkout":
+                booked.discard(table_number)
+
+        def worker(worker_number):
+            try:
+                for attempt in range(attempts):
+                    seconds = random.choice((0.0001, 300))
+                    reservation = engine.Table.reserve(seconds=seconds)
+                    if reservation is None:
+                        continue
+                    order = engine.Order(reservation[0], f"worker {worker_number} {attempt}")
+                    order.hold = reservation[1]
+                    if random.random() < .1:
+                        engine.Table.release(*reservation)
+                        continue
+                    try:
+                        engine.OrderEngine.book(order)
+                    except ValueError:
+                        continue  # hold expired and the table was taken
+                    for menu_id in random.sample(menu_ids, min(3, len(menu_ids))):
+                        engine.OrderEngine.set_quantity(order, menu_id, 2)
+                    engine.OrderEngine.checkout(order.table_number)
+            except Exception as error:
+                errors.append(error)
+
+        engine.Table.subscribe(on_table_change)
+        try:
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        finally:
+            engine.Table.unsubscribe(on_table_change)
+            journal.close()
+        if errors:
+            raise errors[0]
+        assert not double_bookings, f"tables booked twice: {double_bookings[:10]}"
+        assert not engine.Table.booked_tables, "tables left booked"
+
+    return {f'booking_contention_{threads}_threads': {
+        **measure(run, repeat), 'operations': threads * attempts}}
+
+
+def bench_order_memory(number_of_tables: int) -> dict:
+    """Memory traced while booking every table with a small order
+
+    Orders only keep the menu they contain, so the bytes per order
+    should not grow with the catalog size.
+    """
+    engine.Table.setup(number_of_tables)
+    memory = trace_memory(lambda: generate_tables(number_of_tables, booked_ratio=1))
+    engine.Table.setup(number_of_tables)
+    return {'booked_orders_memory': {
+        **memory, 'bytes_per_order': memory['bytes'] // number_of_tables}}
+
+
+def bench_images(server: ImageServer, repeat: int) -> dict:
+    """Cold download + decode, then disk cache hits"""
+    cache_dir = tempfile.mkdtemp(prefix='kafe-images-')
+    kafe.CustomImage.cache_dir = cache_dir
+    counter = iter(range(10**9))
+    try:
+        return {
+            'custom_image_fetch_cold': measure(
+                lambda: kafe.CustomImage.fetch(server.url(f"cold{next(counter)}"), (1024, 576)), repeat),
+            'custom_image_fetch_disk_cache': measure(
+                lambda: kafe.CustomImage.fetch(server.url("cold0"), (1024, 576)), repeat),
+        }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def bench_image_decode(repeat: int) -> dict:
+    """CustomImage.decode against the former Image.open().resize() path"""
+    from PIL import Image
+    results = {}
+    for width, height in ((2048, 1152), (4032, 2268)):
+        buffer = io.BytesIO()
+        Image.effect_noise((width, height), 64).convert('RGB').save(buffer, 'JPEG')
+        data = buffer.getvalue()
+        results[f'image_decode_{width}x{height}_open_resize'] = measure(
+            lambda: Image.open(io.BytesIO(data)).resize((1024, 576)), repeat)
+        results[f'image_decode_{width}x{height}_draft_reduce'] = measure(
+            lambda: kafe.CustomImage.decode(data, (1024, 576)), repeat)
+    return results
+
+
+def bench_gui(app, number_of_tables: int, repeat: int) -> dict:
+    def flush():
+        app.update_idletasks()
+
+    order = engine.Order(1, 'benchmark')
+    pages = []
+
+    def create_menu_page():
+        page = kafe.DisplayMenuPage(
+            kafe.MainApp.container, mode="order", order=order)
+        page.pack()
+        flush()
+        pages.append(page)
+    results = {'display_menu_page_init': measure(create_menu_page, repeat)}
+
+    page = pages[-1]
+    categories = iter(["MEALS", "DRINKS", "SIDES", "ALL"] * repeat)
+
+    def change_category():
+        page.category_menu_combobox.set(next(categories))
+        page.change_category()
+        flush()
+    results['display_menu_change_category'] = measure(change_category, repeat)
+    for page in pages:
+        page.destroy()
+
+    generate_tables(number_of_tables)
+    table_page = kafe.TableDisplayPage(kafe.MainApp.container, mode="checkout")
+    table_page.pack()
+    flush()
+    results['table_display_update_button_style'] = measure(
+        lambda: (table_page.update_button_style(), flush()), repeat)
+    table_page.destroy()
+    return results
+
+
+@contextlib.contextmanager
+def virtual_display():
+    """Yield True if a display is available, starting Xvfb if needed"""
+    if os.environ.get('DISPLAY'):
+        yield True
+        return
+    if not shutil.which('Xvfb'):
+        yield False
+        return
+    display = ':99'
+    xvfb = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x720x24'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(.5)
+    try:
+        yield True
+    finally:
+        xvfb.terminate()
+        del os.environ['DISPLAY']
+
+
+def get_version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the kafe app")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="number of menu items per run (default: 1000 10000 100000)")
+    parser.add_argument('--load-scales', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="number of menu items for menu loading (default: 1000 100000 1000000)")
+    parser.add_argument('--tables', type=int, default=500,
+                        help="number of tables for table cases (default: 500)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="repetitions per case (default: 5)")
+    parser.add_argument('--output', default='bench_output.json',
+                        help="JSON result file (default: bench_output.json)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    report = {
+        'version': get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': [],
+    }
+
+    def add(scale, results):
+        for name, result in results.items():
+            report['results'].append({'case': name, 'scale': scale, **result})
+            if 'bytes' in result:
+                print(f"{name:<36} {scale:>8}  {result['bytes'] / 1024:10.1f} KiB, "
+                      f"peak {result['peak_bytes'] / 1024:.1f} KiB")
+            else:
+                print(f"{name:<36} {scale:>8}  median {result['median'] * 1000:10.3f} ms")
+
+    server = None
+    if kafe is None:
+        print("No tkinter or Pillow, GUI and image cases skipped.")
+        report['skipped'] = ['gui', 'images']
+    else:
+        server = ImageServer()
+        for page_class in (kafe.LandingPage, kafe.CreateOrderPage,
+                           kafe.DisplayMenuPage, kafe.TableDisplayPage):
+            page_class.background_url = server.url(page_class.__name__)
+    work_dir = tempfile.mkdtemp(prefix='kafe-bench-')
+    engine.MenuCatalog.cache_dir = work_dir
+    try:
+        with virtual_display() as has_display:
+            app = None
+            if kafe is not None and has_display:
+                app = kafe.MainApp()
+            elif kafe is not None:
+                print("No display and no Xvfb, GUI cases skipped.")
+                report['skipped'] = ['gui']
+
+            for scale in args.load_scales:
+                path = os.path.join(work_dir, f"menu_{scale}.txt")
+                generate_menu(path, scale)
+                add(scale, bench_fetch_menu(path, args.repeat))
+            for scale in args.scales:
+                path = os.path.join(work_dir, f"menu_{scale}.txt")
+                generate_menu(path, scale)
+                add(scale, bench_reprice(path, args.repeat))
+                add(scale, bench_menu_reload(path, args.repeat))
+                add(scale, bench_order(args.repeat))
+                add(scale, bench_order_memory(args.tables))
+                if app is not None:
+                    add(scale, bench_gui(app, args.tables, args.repeat))
+
+            add(args.tables, bench_journal(args.tables, work_dir, args.repeat))
+            add(args.tables, bench_booking_contention(args.tables, work_dir, args.repeat))
+            if server is not None:
+                add(1, bench_images(server, args.repeat))
+                add(1, bench_image_decode(args.repeat))
+            if app is not None:
+                app.destroy()
+    finally:
+        if server is not None:
+            server.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
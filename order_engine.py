@@ -0,0 +1,2250 @@
+"""Headless order engine of Kafe Daun-Daun Pacilkom
+
+Menu, orders and tables with their journal and sales history, the
+table server and the batch runner. Nothing here imports tkinter, so
+booking logic runs on servers without a display:
+
+    python order_engine.py --batch FILE | --serve ADDRESS | --load-test ADDRESS
+    python order_engine.py --state-dir DIR --sales-report | --export-sales FILE
+
+The window, C_JSK_2206081194_IlhamAbdillahAlhamdi_TP04.py, imports
+this module and accepts the same options.
+"""
+from __future__ import annotations
+import time
+import os
+import json
+import argparse
+import sys
+from collections.abc import Sequence
+from array import array
+import threading
+import functools
+import heapq
+import bisect
+import itertools
+import pickle
+import queue
+from typing import Literal
+# Imported where first used: urllib.request, hashlib, random, shlex,
+# asyncio, csv and the optional numpy and pyarrow
+
+
+class Instrument:
+    """Opt-in latency histograms of the hot paths
+
+    Enabled by starting the app with KAFE_INSTRUMENT=1. Durations are
+    counted in power-of-two microsecond buckets. When disabled, timed()
+    returns the function itself, so instrumented code runs unchanged.
+    The results are dumped to KAFE_INSTRUMENT_FILE (default
+    instrument_output.json) on exit, and F12 shows them in the window.
+    """
+    enabled = os.environ.get('KAFE_INSTRUMENT') == '1'
+    output_path = os.environ.get(
+        'KAFE_INSTRUMENT_FILE', 'instrument_output.json')
+    histograms = {}
+    lock = threading.Lock()
+    widget_counter = None  # set by the window, returns live widgets per page
+
+    @staticmethod
+    def timed(function):
+        """Decorator recording every call of function"""
+        if not Instrument.enabled:
+            return function
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Instrument.record(name, time.perf_counter() - start)
+        return wrapper
+
+    @staticmethod
+    def record(name: str, seconds: float) -> None:
+        bucket = int(seconds * 1e6).bit_length()  # < 2**bucket microseconds
+        with Instrument.lock:
+            histogram = Instrument.histograms.get(name)
+            if histogram is None:
+                histogram = Instrument.histograms[name] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': [0] * 40}
+            histogram['count'] += 1
+            histogram['total'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            histogram['buckets'][min(bucket, 39)] += 1
+
+    @staticmethod
+    def get_percentile(histogram: dict, p: float) -> float:
+        """Upper bound in ms of the bucket holding the p-th percentile"""
+        target = p * histogram['count']
+        seen = 0
+        for bucket, count in enumerate(histogram['buckets']):
+            seen += count
+            if seen >= target:
+                break
+        return min(2 ** bucket / 1000, histogram['max'] * 1000)
+
+    @staticmethod
+    def summary() -> dict:
+        with Instrument.lock:
+            histograms = {name: dict(histogram, buckets=list(histogram['buckets']))
+                          for name, histogram in Instrument.histograms.items()}
+        result = {'timings': {}, 'widgets': {}}
+        for name, histogram in sorted(histograms.items()):
+            result['timings'][name] = {
+                'count': histogram['count'],
+                'mean_ms': histogram['total'] / histogram['count'] * 1000,
+                'p50_ms': Instrument.get_percentile(histogram, .5),
+                'p95_ms': Instrument.get_percentile(histogram, .95),
+                'p99_ms': Instrument.get_percentile(histogram, .99),
+                'max_ms': histogram['max'] * 1000,
+                'buckets_us': {f"<{2 ** bucket}": count
+                               for bucket, count in enumerate(histogram['buckets']) if count},
+            }
+        if Instrument.widget_counter is not None:
+            result['widgets'] = Instrument.widget_counter()
+        return result
+
+    @staticmethod
+    def dump() -> None:
+        if not Instrument.enabled:
+            return
+        with open(Instrument.output_path, 'w', encoding='utf-8') as file:
+            json.dump(Instrument.summary(), file, indent=2)
+
+
+class Menu:
+    __slots__ = ('id', 'name', 'price', 'additional_info')
+    catalog: 'MenuCatalog' = None  # loaded by fetch_menu()
+    category = None
+
+    def __init__(self, id, name, price, additional_info) -> None:
+        self.id = id
+        self.name = name
+        self.price = int(price)
+        self.additional_info = additional_info
+
+    def get_data(self) -> list:
+        return [self.id, self.name, self.price, self.additional_info]
+
+    def __reduce__(self):
+        # Pickle as a constructor call, much faster to load than slot state
+        return self.__class__, (self.id, self.name, self.price, self.additional_info)
+
+
+class Meals(Menu):
+    __slots__ = ()
+    category = "MEALS"
+    additional_info_name = "Kegurihan"
+
+    def __init__(self, id, name, price, tingkat_kegurihan) -> None:
+        super().__init__(id, name, price, tingkat_kegurihan)
+
+
+class Drinks(Menu):
+    __slots__ = ()
+    category = "DRINKS"
+    additional_info_name = "Kemanisan"
+
+    def __init__(self, id, name, price, tingkat_kemanisan) -> None:
+        super().__init__(id, name, price, tingkat_kemanisan)
+
+
+class Sides(Menu):
+    __slots__ = ()
+    category = "SIDES"
+    additional_info_name = "Keviralan"
+
+    def __init__(self, id, name, price, tingkat_keviralan) -> None:
+        super().__init__(id, name, price, tingkat_keviralan)
+
+
+class MenuCatalog:
+    """Menu items indexed by id and by category
+
+    For search(), the lowercase words of every id and name are kept
+    sorted in search_words with the menu position of each word in
+    search_positions, so a word prefix is one bisect away. The index is
+    built by build_search_index() once per catalog version.
+
+    Positions are indexes in get_category("ALL"). sort_orders keeps the
+    positions of every category sorted by every sort column, built by
+    build_sort_orders() and kept valid by reprice().
+    """
+    categories = ("MEALS", "DRINKS", "SIDES")
+    sort_columns = ("price", "additional_info")
+    cache_version = 3  # bump when the pickled layout changes
+    # Written and read only by this app, never next to a pushed menu file
+    cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                             'kafe-daun-daun')
+
+    def __init__(self) -> None:
+        self.items: dict[str, Menu] = {}
+        self.category_items: dict[str, list[Menu]] = {
+            category: [] for category in MenuCatalog.categories}
+        self.version = 0
+        self.search_version = None
+        self.search_menus: list[Menu] = []
+        self.search_keys: list[str] = []  # ' <word> <word>...' per menu
+        self.search_words: list[str] = []
+        self.search_positions = array('l')
+        self.sort_version = None
+        self.sort_orders: dict[tuple[str, str], array] = {}
+
+    def add(self, menu: Menu) -> None:
+        if menu.id in self.items:
+            raise ValueError(f"Duplicate menu id '{menu.id}'")
+        self.items[menu.id] = menu
+        self.category_items[menu.category].append(menu)
+        self.version += 1
+
+    def get(self, menu_id: str) -> Menu | None:
+        return self.items.get(menu_id)
+
+    def get_category(self, category: str) -> list[Menu]:
+        """Menu of a category in file order, "ALL" for every category"""
+        if category == "ALL":
+            return list(self.items.values())
+        return self.category_items[category]
+
+    def get_id_names(self):
+        """(id, name) of every menu in file order"""
+        return ((menu.id, menu.name) for menu in self.items.values())
+
+    def reprice(self, category: str, percent: float) -> int:
+        """Change the price of a category, or "ALL", by percent
+
+        Menu objects are replaced, so existing orders keep the price
+        they were ordered at. Returns the number of repriced menu.
+        """
+        factor = 1 + percent / 100
+        categories = MenuCatalog.categories if category == "ALL" else (category,)
+        count = 0
+        for name in categories:
+            repriced = [menu.__class__(menu.id, menu.name, round(menu.price * factor),
+                                       menu.additional_info)
+                        for menu in self.category_items[name]]
+            self.category_items[name] = repriced
+            self.items.update((menu.id, menu) for menu in repriced)
+            count += len(repriced)
+        if self.search_version == self.version:
+            self.search_menus = self.get_category("ALL")
+        self.bump_price_version(categories, factor)
+        return count
+
+    def bump_price_version(self, categories: tuple[str], factor: float) -> None:
+        """New version after multiplying the prices of categories by factor
+
+        Ids and names are unchanged, so the search index stays valid.
+        The price order is unchanged too, or reversed by a negative
+        factor, so the sort orders are kept without sorting again.
+        """
+        if self.search_version == self.version:
+            self.search_version += 1
+        if self.sort_version == self.version:
+            self.sort_version += 1
+            if factor < 0:
+                for category in categories:
+                    self.sort_orders[category, "price"].reverse()
+        self.version += 1
+
+    def build_sort_orders(self) -> None:
+        """Sort the positions of every category by every sort column"""
+        menus = self.get_category("ALL")
+        positions = {category: [] for category in MenuCatalog.categories}
+        for position, menu in enumerate(menus):
+            positions[menu.category].append(position)
+        for column in MenuCatalog.sort_columns:
+            values = [getattr(menu, column) for menu in menus]
+            for category, category_positions in positions.items():
+                self.sort_orders[category, column] = array(
+                    'q', sorted(category_positions, key=values.__getitem__))
+        self.sort_version = self.version
+
+    def get_sort_order(self, category: str, column: str) -> array:
+        """Positions of category sorted by column, ascending and stable"""
+        if self.sort_version != self.version:
+            self.build_sort_orders()
+        return self.sort_orders[category, column]
+
+    def get_subtotals(self, quantities: dict[str, int]) -> dict[str, int]:
+        """Price of quantities per category at the current prices"""
+        subtotals = dict.fromkeys(MenuCatalog.categories, 0)
+        for menu_id, quantity in quantities.items():
+            menu = self.items[menu_id]
+            subtotals[menu.category] += menu.price * quantity
+        return subtotals
+
+    def get_records(self):
+        """(id, category, name, price, additional info) of every menu in file order"""
+        return ((menu.id, menu.category, menu.name, menu.price, menu.additional_info)
+                for menu in self.items.values())
+
+    def diff(self, new: MenuCatalog) -> tuple[list[str], list[str], list[str]]:
+        """Ids of the menu added, removed and changed in new
+
+        Both catalogs are walked side by side, stepping over added and
+        removed menu, which is the whole file unless a menu was moved.
+        Only the rest after a move is matched through a dict.
+        """
+        records, new_records = self.get_records(), new.get_records()
+        added, removed, changed = [], [], []
+        record, new_record = next(records, None), next(new_records, None)
+        while record is not None and new_record is not None:
+            if record[0] == new_record[0]:
+                if record != new_record:
+                    changed.append(record[0])
+                record, new_record = next(records, None), next(new_records, None)
+            elif new_record[0] not in self:
+                added.append(new_record[0])
+                new_record = next(new_records, None)
+            elif record[0] not in new:
+                removed.append(record[0])
+                record = next(records, None)
+            else:
+                break
+        old_rest = {} if record is None else {record[0]: record}
+        old_rest.update((record[0], record) for record in records)
+        for new_record in itertools.chain(() if new_record is None else (new_record,), new_records):
+            record = old_rest.pop(new_record[0], None)
+            if record is None:
+                added.append(new_record[0])
+            elif record != new_record:
+                changed.append(new_record[0])
+        return added, removed + list(old_rest), changed
+
+    def has_same_order(self, new: MenuCatalog) -> bool:
+        """new lists the same menu ids in the same order"""
+        return len(self) == len(new) and all(map(str.__eq__, self.items, new.items))
+
+    def update_menus(self, new: MenuCatalog, menu_ids: list[str]) -> bool:
+        """Take the price and additional info of menu_ids from new
+
+        Returns False, changing nothing, when the name or category of
+        one of them differs too.
+        """
+        menus = [new.get(menu_id) for menu_id in menu_ids]
+        for menu in menus:
+            old = self.get(menu.id)
+            if old is None or (old.name, old.category) != (menu.name, menu.category):
+                return False
+        replaced = {}
+        for menu in menus:
+            replaced.setdefault(menu.category, {})[menu.id] = menu
+        all_menus = self.get_category("ALL")
+        changed = {menu.id: menu for menu in menus}
+        positions = []
+        if self.sort_version == self.version:
+            positions = [(menu.category, position) for position, menu in enumerate(all_menus)
+                         if menu.id in changed]
+
+        def update() -> None:
+            for category, category_menus in replaced.items():
+                self.category_items[category] = [category_menus.get(menu.id, menu)
+                                                 for menu in self.category_items[category]]
+            self.items.update((menu.id, menu) for menu in menus)
+            for _, position in positions:
+                all_menus[position] = changed[all_menus[position].id]
+            if self.search_version == self.version:
+                self.search_menus = self.get_category("ALL")
+        self.update_data(positions, lambda column, position: getattr(all_menus[position], column),
+                         update)
+        return True
+
+    def update_data(self, positions: list[tuple[str, int]], get_value, update) -> None:
+        """Change prices or additional infos in place with update()
+
+        The search index stays valid. The (category, position) of the
+        changed menu are taken out of the sort orders, then inserted
+        again by bisect once update() is done, so sorting is not redone.
+        get_value(column, position) reads the current value.
+        """
+        sorted_version = self.sort_version == self.version
+        keys = {column: functools.partial(lambda column, position: (get_value(column, position), position),
+                                          column)
+                for column in MenuCatalog.sort_columns}
+        if sorted_version:
+            for (category, column), order in self.sort_orders.items():
+                key = keys[column]
+                for position in (position for menu_category, position in positions
+                                 if menu_category == category):
+                    del order[bisect.bisect_left(order, key(position), key=key)]
+        update()
+        if sorted_version:
+            for (category, column), order in self.sort_orders.items():
+                for position in (position for menu_category, position in positions
+                                 if menu_category == category):
+                    bisect.insort(order, position, key=keys[column])
+        if self.search_version == self.version:
+            self.search_version += 1
+        if sorted_version:
+            self.sort_version += 1
+        self.version += 1
+
+    def build_indexes(self) -> None:
+        """Build the search index and sort orders, off the Tk thread if possible"""
+        self.build_search_index()
+        self.build_sort_orders()
+
+    def build_search_index(self) -> None:
+        """Index the words of every menu id and name"""
+        self.search_menus = self.get_category("ALL")
+        self.search_keys = [' ' + ' '.join(f"{menu_id} {name}".lower().split())
+                            for menu_id, name in self.get_id_names()]
+        words, positions = [], []
+        for position, key in enumerate(self.search_keys):
+            for word in set(key.split()):
+                words.append(sys.intern(word))
+                positions.append(position)
+        order = sorted(range(len(words)), key=words.__getitem__)
+        self.search_words = [words[i] for i in order]
+        self.search_positions = array('l', [positions[i] for i in order])
+        self.search_version = self.version
+
+    def get_prefix_range(self, word: str) -> tuple[int, int]:
+        """Slice of search_words starting with word"""
+        return (bisect.bisect_left(self.search_words, word),
+                bisect.bisect_left(self.search_words, word[:-1] + chr(ord(word[-1]) + 1)))
+
+    def search(self, query: str, previous: tuple[str, list[int]] | None = None) -> list[int]:
+        """Positions in search_menus where every query word starts a word
+
+        previous is the (query, result) of the last search. When query
+        extends that query, its result is narrowed instead of looking
+        up the index, if it is the smaller candidate set.
+        """
+        if self.search_version != self.version:
+            self.build_search_index()
+            previous = None  # positions of the old index
+        words = query.lower().split()
+        if not words:
+            return list(range(len(self.search_menus)))
+        ranges = {word: self.get_prefix_range(word) for word in words}
+        word = min(words, key=lambda word: ranges[word][1] - ranges[word][0])
+        start, end = ranges[word]
+        previous_words = previous[0].lower().split() if previous else []
+        if (previous_words and query.lower().startswith(previous[0].lower())
+                and len(previous[1]) <= end - start):
+            # Only the last previous word and the new words can differ
+            result = previous[1]
+            words = words[len(previous_words) - 1:]
+        elif start == end:
+            return []
+        else:
+            if self.search_words[start] == self.search_words[end - 1]:
+                # One word, its positions are already sorted
+                result = self.search_positions[start:end].tolist()
+            else:
+                result = sorted(set(self.search_positions[start:end]))
+            words = [other for other in words if other != word]
+        keys = self.search_keys
+        for word in words:
+            pattern = ' ' + word
+            result = [position for position in result if pattern in keys[position]]
+        return result
+
+    def __contains__(self, menu_id: str) -> bool:
+        return menu_id in self.items
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class MenuRows(Sequence):
+    """Rows of a ColumnarMenuCatalog, Menu objects are made on access"""
+    __slots__ = ('catalog', 'rows')
+
+    def __init__(self, catalog: 'ColumnarMenuCatalog', rows: Sequence[int] = None) -> None:
+        self.catalog = catalog
+        self.rows = range(len(catalog)) if rows is None else rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MenuRows(self.catalog, self.rows[index])
+        return self.catalog.get_row(self.rows[index])
+
+
+class ColumnarMenuCatalog(MenuCatalog):
+    """MenuCatalog keeping every field in its own column
+
+    Only the ids stay Python strings, for the id lookup. Names are one
+    UTF-8 buffer with end offsets, prices, additional infos and category
+    codes are arrays of machine integers, so no object is kept per menu.
+    Menu objects are made on access with the current price. Repricing
+    and order subtotals use NumPy on the arrays when it is installed,
+    plain loops otherwise.
+    """
+    menu_types = {"MEALS": Meals, "DRINKS": Drinks, "SIDES": Sides}
+    use_numpy = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rows: dict[str, int] = {}  # menu id -> row
+        self.ids: list[str] = []
+        self.name_data = bytearray()
+        self.name_ends = array('q')
+        self.prices = array('q')
+        self.additional_infos = array('q')
+        self.category_codes = array('b')  # index in MenuCatalog.categories
+        self.category_rows = {category: array('q')
+                              for category in MenuCatalog.categories}
+
+    @staticmethod
+    def get_numpy():
+        """numpy module, None if it is not installed or not used"""
+        if not ColumnarMenuCatalog.use_numpy:
+            return None
+        try:
+            import numpy
+        except ImportError:
+            return None
+        return numpy
+
+    def add(self, menu: Menu) -> None:
+        if menu.id in self.rows:
+            raise ValueError(f"Duplicate menu id '{menu.id}'")
+        row = len(self.ids)
+        self.rows[menu.id] = row
+        self.ids.append(menu.id)
+        self.name_data += menu.name.encode()
+        self.name_ends.append(len(self.name_data))
+        self.prices.append(menu.price)
+        self.additional_infos.append(int(menu.additional_info))
+        self.category_codes.append(MenuCatalog.categories.index(menu.category))
+        self.category_rows[menu.category].append(row)
+        self.version += 1
+
+    def get_name(self, row: int) -> str:
+        start = self.name_ends[row - 1] if row else 0
+        return self.name_data[start:self.name_ends[row]].decode()
+
+    def get_row(self, row: int) -> Menu:
+        category = MenuCatalog.categories[self.category_codes[row]]
+        return ColumnarMenuCatalog.menu_types[category](
+            self.ids[row], self.get_name(row), self.prices[row], self.additional_infos[row])
+
+    def get(self, menu_id: str) -> Menu | None:
+        row = self.rows.get(menu_id)
+        return None if row is None else self.get_row(row)
+
+    def get_category(self, category: str) -> MenuRows:
+        if category == "ALL":
+            return MenuRows(self)
+        return MenuRows(self, self.category_rows[category])
+
+    def get_id_names(self):
+        return zip(self.ids, map(self.get_name, range(len(self))))
+
+    def reprice(self, category: str, percent: float) -> int:
+        factor = 1 + percent / 100
+        rows = None if category == "ALL" else self.category_rows[category]
+        numpy = ColumnarMenuCatalog.get_numpy()
+        if numpy is not None:
+            prices = numpy.frombuffer(self.prices, dtype=numpy.int64)
+            if rows is None:
+                prices[:] = numpy.rint(prices * factor)
+            else:
+                rows = numpy.frombuffer(rows, dtype=numpy.int64)
+                prices[rows] = numpy.rint(prices[rows] * factor)
+        elif rows is None:
+            self.prices = array('q', [round(price * factor) for price in self.prices])
+        else:
+            prices = self.prices
+            for row in rows:
+                prices[row] = round(prices[row] * factor)
+        self.bump_price_version(
+            MenuCatalog.categories if category == "ALL" else (category,), factor)
+        return len(self) if rows is None else len(rows)
+
+    def get_records(self):
+        categories = map(MenuCatalog.categories.__getitem__, self.category_codes)
+        names = (self.name_data[start:end].decode()
+                 for start, end in zip(itertools.chain((0,), self.name_ends), self.name_ends))
+        return zip(self.ids, categories, names, self.prices, self.additional_infos)
+
+    def diff(self, new: MenuCatalog) -> tuple[list[str], list[str], list[str]]:
+        numpy = ColumnarMenuCatalog.get_numpy()
+        if (numpy is None or not isinstance(new, ColumnarMenuCatalog)
+                or not self.ids or self.ids != new.ids):
+            return super().diff(new)
+        # Same ids in the same order, compare whole columns
+        different = numpy.zeros(len(self), dtype=bool)
+        for values, new_values, dtype in ((self.prices, new.prices, numpy.int64),
+                                          (self.additional_infos, new.additional_infos, numpy.int64),
+                                          (self.category_codes, new.category_codes, numpy.int8)):
+            different |= numpy.frombuffer(values, dtype=dtype) != numpy.frombuffer(new_values, dtype=dtype)
+        if self.name_ends != new.name_ends:
+            different |= numpy.fromiter(map(str.__ne__, map(self.get_name, range(len(self))),
+                                            map(new.get_name, range(len(self)))), bool, len(self))
+        elif self.name_data != new.name_data:
+            changed_bytes = numpy.flatnonzero(numpy.frombuffer(self.name_data, dtype=numpy.uint8)
+                                              != numpy.frombuffer(new.name_data, dtype=numpy.uint8))
+            different[numpy.searchsorted(numpy.frombuffer(self.name_ends, dtype=numpy.int64),
+                                         changed_bytes, side='right')] = True
+        return [], [], [self.ids[row] for row in numpy.flatnonzero(different)]
+
+    def has_same_order(self, new: MenuCatalog) -> bool:
+        if isinstance(new, ColumnarMenuCatalog):
+            return self.ids == new.ids
+        return len(self) == len(new) and all(map(str.__eq__, self.ids, new.items))
+
+    def update_menus(self, new: ColumnarMenuCatalog, menu_ids: list[str]) -> bool:
+        rows = [(self.rows.get(menu_id), new.rows[menu_id]) for menu_id in menu_ids]
+        for row, new_row in rows:
+            if (row is None or self.category_codes[row] != new.category_codes[new_row]
+                    or self.get_name(row) != new.get_name(new_row)):
+                return False
+        columns = {"price": self.prices, "additional_info": self.additional_infos}
+
+        def update() -> None:
+            for row, new_row in rows:
+                self.prices[row] = new.prices[new_row]
+                self.additional_infos[row] = new.additional_infos[new_row]
+        self.update_data([(MenuCatalog.categories[self.category_codes[row]], row) for row, _ in rows],
+                         lambda column, row: columns[column][row], update)
+        return True
+
+    def build_sort_orders(self) -> None:
+        numpy = ColumnarMenuCatalog.get_numpy()
+        for column, values in (("price", self.prices), ("additional_info", self.additional_infos)):
+            for category, rows in self.category_rows.items():
+                if numpy is None or not rows:
+                    order = array('q', sorted(rows, key=values.__getitem__))
+                else:
+                    rows = numpy.frombuffer(rows, dtype=numpy.int64)
+                    column_values = numpy.frombuffer(values, dtype=numpy.int64)[rows]
+                    order = array('q', rows[numpy.argsort(column_values, kind='stable')].tobytes())
+                self.sort_orders[category, column] = order
+        self.sort_version = self.version
+
+    def get_subtotals(self, quantities: dict[str, int]) -> dict[str, int]:
+        numpy = ColumnarMenuCatalog.get_numpy()
+        if numpy is None or not quantities:
+            subtotals = [0] * len(MenuCatalog.categories)
+            for menu_id, quantity in quantities.items():
+                row = self.rows[menu_id]
+                subtotals[self.category_codes[row]] += self.prices[row] * quantity
+        else:
+            rows = numpy.fromiter(map(self.rows.__getitem__, quantities), numpy.int64, len(quantities))
+            amounts = numpy.frombuffer(self.prices, dtype=numpy.int64)[rows] \
+                * numpy.fromiter(quantities.values(), numpy.int64, len(quantities))
+            codes = numpy.frombuffer(self.category_codes, dtype=numpy.int8)[rows]
+            subtotals = [int(amounts[codes == code].sum())
+                         for code in range(len(MenuCatalog.categories))]
+        return dict(zip(MenuCatalog.categories, subtotals))
+
+    def __contains__(self, menu_id: str) -> bool:
+        return menu_id in self.rows
+
+    def __iter__(self):
+        return iter(MenuRows(self))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class OrderedMenu:
+    __slots__ = ('menu', 'quantity')
+
+    def __init__(self, menu: Meals | Drinks | Sides, quantity: int) -> None:
+        self.menu = menu
+        self.quantity = quantity
+
+
+class Order:
+    """Ordered menu of a table
+
+    Only menu with non-zero quantity is stored, untouched menu is
+    reported with quantity 0 by get_ordered_menu().
+    """
+    __slots__ = ('table_number', 'username', 'ordered_menus',
+                 'subtotals', 'total_price', 'hold', 'booked_at')
+
+    def __init__(self, table_number: int, username: str) -> None:
+        self.table_number = table_number
+        self.username = username
+        self.hold = None  # token from Table.reserve() until booked
+        self.booked_at = None  # time.time() of Table.book()
+        self.ordered_menus: dict[str, OrderedMenu] = {}
+        # Running totals, updated by set_quantity()
+        self.subtotals = dict.fromkeys(MenuCatalog.categories, 0)
+        self.total_price = 0
+
+    def get_ordered_menu(self, menu_id: str) -> OrderedMenu:
+        ordered_menu = self.ordered_menus.get(menu_id)
+        if ordered_menu is None:
+            ordered_menu = OrderedMenu(Menu.catalog.get(menu_id), 0)
+        return ordered_menu
+
+    def get_quantity(self, menu_id: str) -> int:
+        ordered_menu = self.ordered_menus.get(menu_id)
+        return ordered_menu.quantity if ordered_menu else 0
+
+    def set_quantity(self, ordered_menu: OrderedMenu, quantity: int) -> None:
+        """Change quantity and update totals by the difference"""
+        menu = ordered_menu.menu
+        with Table.lock:
+            delta = (quantity - self.get_quantity(menu.id)) * menu.price
+            ordered_menu.quantity = quantity
+            if quantity:
+                self.ordered_menus[menu.id] = ordered_menu
+            else:
+                self.ordered_menus.pop(menu.id, None)
+            self.subtotals[menu.category] += delta
+            self.total_price += delta
+            if Table.all_tables.get(self.table_number) is self:
+                Table.notify("quantity", self.table_number, menu.id)
+
+    def get_total_price(self) -> int:
+        return self.total_price
+
+    def recalculate(self) -> None:
+        """Recompute the totals of ordered_menus in one catalog call"""
+        self.subtotals = Menu.catalog.get_subtotals(
+            {menu_id: ordered_menu.quantity for menu_id, ordered_menu in self.ordered_menus.items()})
+        self.total_price = sum(self.subtotals.values())
+
+    def update_menus(self, menu_ids: list[str]) -> None:
+        """Take the current catalog's menu of menu_ids
+
+        Totals are moved by the price difference, menu no longer in the
+        catalog are dropped. Menu not in the order are skipped, so it
+        is safe to call twice.
+        """
+        if len(menu_ids) > len(self.ordered_menus):
+            wanted = set(menu_ids)
+            menu_ids = [menu_id for menu_id in self.ordered_menus if menu_id in wanted]
+        for menu_id in menu_ids:
+            ordered_menu = self.ordered_menus.get(menu_id)
+            if ordered_menu is None:
+                continue
+            menu = Menu.catalog.get(menu_id)
+            if menu is None:
+                self.set_quantity(ordered_menu, 0)
+                continue
+            old_amount = ordered_menu.menu.price * ordered_menu.quantity
+            amount = menu.price * ordered_menu.quantity
+            self.subtotals[ordered_menu.menu.category] -= old_amount
+            self.subtotals[menu.category] += amount
+            self.total_price += amount - old_amount
+            ordered_menu.menu = menu
+
+    def get_subtotal(self, category: str) -> int:
+        return self.subtotals[category]
+
+
+class Table:
+    """Registry of the cafe tables
+
+    Besides all_tables, the free tables, the booked tables and the
+    usernames of booked orders are kept up to date on every book and
+    checkout, so lookups never scan every table.
+
+    A table can be held for an order in progress with reserve(), which
+    takes it out of the free tables until the hold is confirmed,
+    released or expires. All changes take Table.lock, so the registry
+    can be shared by many threads.
+    """
+    all_tables: dict[int, Order] = {}
+    free_tables: list[int] = []        # list for O(1) random.choice
+    free_index: dict[int, int] = {}    # table number -> index in free_tables
+    booked_tables: set[int] = set()
+    usernames: dict[str, int] = {}     # normalized username -> table number
+    holds: dict[int, int] = {}         # table number -> hold token
+    hold_expiry = []                   # heap of (expire time, token, table number)
+    hold_seconds = 300
+    hold_tokens = itertools.count(1)
+    listeners = []                     # called with (event, table number, menu id)
+    lock = threading.RLock()
+
+    @staticmethod
+    def setup(number_of_tables: int = 10) -> None:
+        """Reset registry to empty tables numbered from 1"""
+        with Table.lock:
+            Table.all_tables = dict.fromkeys(range(1, number_of_tables + 1))
+            Table.free_tables = list(Table.all_tables)
+            Table.free_index = {number: i for i,
+                                number in enumerate(Table.free_tables)}
+            Table.booked_tables = set()
+            Table.usernames = {}
+            Table.holds = {}
+            Table.hold_expiry = []
+
+    @staticmethod
+    def subscribe(listener) -> None:
+        Table.listeners.append(listener)
+
+    @staticmethod
+    def unsubscribe(listener) -> None:
+        if listener in Table.listeners:
+            Table.listeners.remove(listener)
+
+    @staticmethod
+    def notify(event: Literal["book", "checkout", "quantity", "hold"], table_number: int, menu_id: str = None) -> None:
+        for listener in list(Table.listeners):
+            listener(event, table_number, menu_id)
+
+    @staticmethod
+    def normalize_username(username: str) -> str:
+        return ' '.join(username.split()).casefold()
+
+    @staticmethod
+    def take_free(table_number: int) -> None:
+        if table_number in Table.free_index:
+            # Swap with the last free table, then pop
+            index = Table.free_index.pop(table_number)
+            last_table = Table.free_tables.pop()
+            if last_table != table_number:
+                Table.free_tables[index] = last_table
+                Table.free_index[last_table] = index
+
+    @staticmethod
+    def put_free(table_number: int) -> None:
+        if table_number not in Table.free_index:
+            Table.free_index[table_number] = len(Table.free_tables)
+            Table.free_tables.append(table_number)
+
+    @staticmethod
+    def book(table_number: int, order: Order) -> None:
+        with Table.lock:
+            previous_order = Table.all_tables[table_number]
+            if previous_order is not None:
+                Table.usernames.pop(Table.normalize_username(
+                    previous_order.username), None)
+            Table.all_tables[table_number] = order
+            if order.booked_at is None:
+                order.booked_at = time.time()
+            Table.holds.pop(table_number, None)
+            Table.take_free(table_number)
+            Table.booked_tables.add(table_number)
+            Table.usernames[Table.normalize_username(
+                order.username)] = table_number
+            Table.notify("book", table_number)
+
+    @staticmethod
+    def checkout(table_number) -> None:
+        with Table.lock:
+            order = Table.all_tables[table_number]
+            if order is None:
+                return
+            Table.all_tables[table_number] = None
+            Table.booked_tables.discard(table_number)
+            Table.put_free(table_number)
+            Table.usernames.pop(
+                Table.normalize_username(order.username), None)
+            Table.notify("checkout", table_number)
+
+    @staticmethod
+    def reserve(table_number: int = None, seconds: float = None) -> tuple[int, int] | None:
+        """Hold a free table, a random one if table_number is None
+
+        Returns (table number, hold token), or None if no such table is
+        free. The hold expires after seconds (default hold_seconds).
+        """
+        with Table.lock:
+            Table.expire_holds()
+            if table_number is None:
+                table_number = Table.random_available()
+            if table_number is None or not Table.is_available(table_number):
+                return None
+            token = next(Table.hold_tokens)
+            Table.holds[table_number] = token
+            Table.take_free(table_number)
+            expire_time = time.monotonic() + (seconds or Table.hold_seconds)
+            heapq.heappush(Table.hold_expiry,
+                           (expire_time, token, table_number))
+            Table.notify("hold", table_number)
+            return table_number, token
+
+    @staticmethod
+    def confirm(table_number: int, token: int, order: Order) -> bool:
+        """Book a held table, False if the hold is no longer valid"""
+        with Table.lock:
+            Table.expire_holds()
+            if Table.holds.get(table_number) != token:
+                return False
+            Table.book(table_number, order)
+            return True
+
+    @staticmethod
+    def has_hold(table_number: int, token: int | None) -> bool:
+        """The hold of token on table_number has not expired"""
+        with Table.lock:
+            Table.expire_holds()
+            return token is not None and Table.holds.get(table_number) == token
+
+    @staticmethod
+    def release(table_number: int, token: int) -> None:
+        """Give up a hold, the table is free again"""
+        with Table.lock:
+            if Table.holds.get(table_number) == token:
+                del Table.holds[table_number]
+                Table.put_free(table_number)
+                Table.notify("hold", table_number)
+
+    @staticmethod
+    def expire_holds() -> None:
+        now = time.monotonic()
+        while Table.hold_expiry and Table.hold_expiry[0][0] <= now:
+            _, token, table_number = heapq.heappop(Table.hold_expiry)
+            Table.release(table_number, token)
+
+    @staticmethod
+    def get_available() -> list[int]:
+        return sorted(Table.free_tables)
+
+    @staticmethod
+    def get_booked() -> list[int]:
+        return sorted(Table.booked_tables)
+
+    @staticmethod
+    def is_available(table_number: int) -> bool:
+        """Table is neither booked nor held"""
+        return table_number in Table.free_index
+
+    @staticmethod
+    def count_available() -> int:
+        return len(Table.free_tables)
+
+    @staticmethod
+    def random_available() -> int | None:
+        import random
+        return random.choice(Table.free_tables) if Table.free_tables else None
+
+    @staticmethod
+    def find_by_username(username: str) -> int | None:
+        """Table number booked under the username, if any"""
+        return Table.usernames.get(Table.normalize_username(username))
+
+
+Table.setup()
+
+
+class Journal:
+    """Crash-safe log of table state
+
+    Every book, checkout and quantity change of a booked order is
+    appended to journal.log as a JSON line with a sequence number. Lines
+    are fsynced in batches, once sync_every events are pending or
+    sync_interval seconds have passed. Every snapshot_every events the
+    state of all tables is written to snapshot.json and the journal
+    starts over, so recovery replays at most snapshot_every events.
+    Files written along, like a SalesHistory, are fsynced in the same
+    batches through synced_with.
+    """
+
+    def __init__(self, directory: str, sync_every: int = 64, sync_interval: float = 1.0,
+                 snapshot_every: int = 5000) -> None:
+        self.directory = directory
+        self.journal_path = os.path.join(directory, 'journal.log')
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.snapshot_every = snapshot_every
+        self.sequence = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.events_since_snapshot = 0
+        self.synced_with = []  # sync() of files fsynced with each batch
+        self.file = None
+
+    def open(self) -> int:
+        """Restore tables from disk, then record new changes
+
+        Returns the number of replayed journal events.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        replayed = self.recover()
+        self.file = open(self.journal_path, 'a', encoding='utf-8')
+        Table.subscribe(self.on_table_change)
+        return replayed
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+        Table.unsubscribe(self.on_table_change)
+        self.sync()
+        self.file.close()
+        self.file = None
+
+    def on_table_change(self, event: str, table_number: int, menu_id: str = None) -> None:
+        if event == "hold":
+            return  # holds are not kept across restarts
+        self.sequence += 1
+        record = {'seq': self.sequence,
+                  **Journal.get_record(event, table_number, menu_id)}
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+        self.unsynced += 1
+        self.events_since_snapshot += 1
+        if self.events_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        else:
+            self.sync_if_due()
+
+    def sync_if_due(self) -> None:
+        if self.unsynced and (self.unsynced >= self.sync_every
+                              or time.monotonic() - self.last_sync >= self.sync_interval):
+            self.sync()
+
+    def sync_periodically(self, stop: threading.Event) -> None:
+        """Call sync_if_due() every sync_interval until stop is set
+
+        Runs on its own thread, so a quiet period does not leave the
+        last lines unsynced. Table.lock keeps it apart from the listener.
+        """
+        while not stop.wait(self.sync_interval):
+            with Table.lock:
+                self.sync_if_due()
+
+    def sync(self) -> None:
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+            for sync in self.synced_with:
+                sync()
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def snapshot(self) -> None:
+        """Write all booked tables, then start an empty journal"""
+        state = {'seq': self.sequence, **Journal.get_state()}
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        # Events up to seq are in the snapshot, an old journal left by a
+        # crash right here is skipped on replay
+        self.file.close()
+        self.file = open(self.journal_path, 'w', encoding='utf-8')
+        for sync in self.synced_with:
+            sync()
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.events_since_snapshot = 0
+
+    def recover(self) -> int:
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            state = {'seq': 0, 'tables': {}}
+        self.sequence = state['seq']
+        Journal.restore_state(state)
+
+        replayed = 0
+        try:
+            with open(self.journal_path, 'r+b') as file:
+                end = 0  # after the last whole line
+                for line in file:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write at the end of the journal, cut it off
+                        # so the next record does not continue it
+                        file.truncate(end)
+                        break
+                    end += len(line)
+                    if record['seq'] <= self.sequence:
+                        continue
+                    Journal.apply(record)
+                    self.sequence = record['seq']
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        self.events_since_snapshot = replayed
+        return replayed
+
+    @staticmethod
+    def get_record(event: str, table_number: int, menu_id: str = None) -> dict:
+        """Describe a Table change, for the journal and TableServer"""
+        order = Table.all_tables[table_number]
+        record = {'event': event, 'table': table_number}
+        if event == "book":
+            record['username'] = order.username
+            record['items'] = Journal.get_items(order)
+            record['booked_at'] = order.booked_at
+        elif event == "quantity":
+            record['menu'] = menu_id
+            record['quantity'] = order.get_quantity(menu_id)
+        return record
+
+    @staticmethod
+    def get_state() -> dict:
+        return {'tables': {str(number): {'username': order.username, 'items': Journal.get_items(order),
+                                         'booked_at': order.booked_at}
+                           for number, order in Table.all_tables.items() if order is not None}}
+
+    @staticmethod
+    def restore_state(state: dict) -> None:
+        for number, data in state['tables'].items():
+            Journal.restore_order(int(number), data['username'], data['items'],
+                                  data.get('booked_at'))
+
+    @staticmethod
+    def apply(record: dict) -> None:
+        """Apply a record made by get_record()"""
+        table_number = record['table']
+        if table_number not in Table.all_tables:
+            print(f"Journal: table {table_number} does not exist, skipped.")
+        elif record['event'] == "book":
+            Journal.restore_order(
+                table_number, record['username'], record['items'], record.get('booked_at'))
+        elif record['event'] == "checkout":
+            Table.checkout(table_number)
+        elif record['event'] == "quantity":
+            order = Table.all_tables[table_number]
+            menu = Menu.catalog.get(record['menu'])
+            if order is not None and menu is not None:
+                order.set_quantity(order.get_ordered_menu(
+                    menu.id), record['quantity'])
+
+    @staticmethod
+    def get_items(order: Order) -> dict[str, int]:
+        return {menu_id: ordered_menu.quantity for menu_id, ordered_menu in order.ordered_menus.items()}
+
+    @staticmethod
+    def restore_order(table_number: int, username: str, items: dict[str, int],
+                      booked_at: float = None) -> None:
+        if table_number not in Table.all_tables:
+            print(f"Journal: table {table_number} does not exist, skipped.")
+            return
+        order = Order(table_number, username)
+        order.booked_at = booked_at
+        for menu_id, quantity in items.items():
+            menu = Menu.catalog.get(menu_id)
+            if menu is None:
+                print(f"Journal: menu '{menu_id}' no longer exists, skipped.")
+            elif quantity:
+                order.ordered_menus[menu_id] = OrderedMenu(menu, quantity)
+        order.recalculate()
+        Table.book(table_number, order)
+
+
+class SalesHistory:
+    """Sales record of checked out orders
+
+    Every checkout appends one CSV row per ordered menu to path, with
+    the order's sale number. Revenue per menu, per category and per hour
+    and the table turnover are running totals updated by the same
+    checkout, so reading them never scans the history. close() saves the
+    totals with the length of the CSV to totals_path, load() starts from
+    them and only streams the rows written after.
+    """
+    columns = ('sale', 'checkout_time', 'booked_time', 'table', 'username',
+               'menu_id', 'name', 'category', 'price', 'quantity', 'amount')
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.totals_path = os.path.splitext(path)[0] + '_totals.json'
+        self.unsynced = False
+        self.file = None
+        self.writer = None
+        self.open_orders: dict[int, Order] = {}  # booked orders by table
+        self.reset_totals()
+
+    def reset_totals(self) -> None:
+        self.offset = 0  # bytes of path counted in the totals
+        self.sales = 0
+        self.revenue = 0
+        self.item_totals: dict[str, list[int]] = {}  # menu id -> [quantity, revenue]
+        self.category_revenue = dict.fromkeys(MenuCatalog.categories, 0)
+        self.hourly_revenue: dict[int, int] = {}  # hours since the epoch -> revenue
+        self.turnovers = 0  # sales with a known booking time
+        self.turnover_seconds = 0.0
+        self.longest_turnover = 0.0
+
+    def load(self) -> None:
+        """Restore the totals, adding the sales written since they were saved"""
+        size = self.get_complete_size()
+        if not (self.load_totals(size) and self.continues_totals()):
+            self.reset_totals()  # count the whole file
+        counted = self.offset
+        for sale in self.read_sales(self.offset):
+            self.add_sale(sale)
+        self.offset = size
+        if size != counted:
+            self.save_totals()
+
+    def load_totals(self, size: int) -> bool:
+        """Read totals_path if it counts at most the first size bytes"""
+        try:
+            with open(self.totals_path, encoding='utf-8') as file:
+                totals = json.load(file)
+            if not 0 < totals['offset'] <= size:
+                return False
+            self.offset = totals['offset']
+            self.sales = totals['sales']
+            self.revenue = totals['revenue']
+            self.item_totals = totals['item_totals']
+            self.category_revenue = totals['category_revenue']
+            self.hourly_revenue = {int(hour): revenue
+                                   for hour, revenue in totals['hourly_revenue'].items()}
+            self.turnovers = totals['turnovers']
+            self.turnover_seconds = totals['turnover_seconds']
+            self.longest_turnover = totals['longest_turnover']
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False  # missing or damaged, load() counts the CSV again
+        return True
+
+    def continues_totals(self) -> bool:
+        """The rows after offset are the sales following the saved totals"""
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset - 1)
+            if file.read(1) != b'\n':
+                return False
+        sale = next(self.read_sales(self.offset), None)
+        return sale is None or int(sale[0]['sale']) == self.sales + 1
+
+    def save_totals(self) -> None:
+        totals = {'offset': self.offset, 'sales': self.sales, 'revenue': self.revenue,
+                  'item_totals': self.item_totals,
+                  'category_revenue': self.category_revenue,
+                  'hourly_revenue': self.hourly_revenue,
+                  'turnovers': self.turnovers,
+                  'turnover_seconds': self.turnover_seconds,
+                  'longest_turnover': self.longest_turnover}
+        temp_path = self.totals_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(totals, file, separators=(',', ':'))
+        os.replace(temp_path, self.totals_path)
+
+    def get_complete_size(self) -> int:
+        """Bytes of path up to the end of its last whole row
+
+        A crash while writing can leave a torn row at the end.
+        """
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return 0
+        with file:
+            position = file.seek(0, os.SEEK_END)
+            while position > 0:
+                step = min(position, 1 << 16)
+                position -= step
+                file.seek(position)
+                newline = file.read(step).rfind(b'\n')
+                if newline >= 0:
+                    return position + newline + 1
+        return 0
+
+    def open(self) -> None:
+        """Load the history, then record checkouts of Table"""
+        size = self.get_complete_size()
+        if os.path.exists(self.path) and os.path.getsize(self.path) != size:
+            os.truncate(self.path, size)  # torn last row, the next one must not continue it
+        self.load()
+        import csv
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(SalesHistory.columns)
+        self.open_orders = {number: order for number, order in Table.all_tables.items()
+                            if order is not None}
+        Table.subscribe(self.on_table_change)
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+        Table.unsubscribe(self.on_table_change)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset = self.file.tell()
+        self.file.close()
+        self.file = None
+        self.save_totals()
+
+    def on_table_change(self, event: str, table_number: int, menu_id: str = None) -> None:
+        if event == "book":
+            self.open_orders[table_number] = Table.all_tables[table_number]
+        elif event == "checkout":
+            order = self.open_orders.pop(table_number, None)
+            if order is not None:
+                self.record(order, time.time())
+
+    def record(self, order: Order, checkout_time: float) -> None:
+        """Write a checked out order and add it to the totals"""
+        sale = [self.sales + 1, f"{checkout_time:.3f}",
+                '' if order.booked_at is None else f"{order.booked_at:.3f}",
+                order.table_number, order.username]
+        rows = []
+        for ordered_menu in order.ordered_menus.values():
+            menu = ordered_menu.menu
+            rows.append(sale + [menu.id, menu.name, menu.category, menu.price,
+                                ordered_menu.quantity, menu.price * ordered_menu.quantity])
+        if not rows:  # keep empty orders for the turnover
+            rows.append(sale + ['', '', '', 0, 0, 0])
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.unsynced = True
+        self.add_sale([dict(zip(SalesHistory.columns, map(str, row))) for row in rows])
+
+    def sync(self) -> None:
+        """fsync the recorded rows, called with each Journal batch"""
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = False
+
+    def add_sale(self, rows: list[dict[str, str]]) -> None:
+        """Add the rows of one sale to the running totals"""
+        checkout_time = float(rows[0]['checkout_time'])
+        hour = int(checkout_time // 3600)
+        self.sales += 1
+        for row in rows:
+            amount = int(row['amount'])
+            self.revenue += amount
+            self.hourly_revenue[hour] = self.hourly_revenue.get(hour, 0) + amount
+            if not row['menu_id']:
+                continue
+            totals = self.item_totals.setdefault(row['menu_id'], [0, 0])
+            totals[0] += int(row['quantity'])
+            totals[1] += amount
+            self.category_revenue[row['category']] = \
+                self.category_revenue.get(row['category'], 0) + amount
+        if rows[0]['booked_time']:
+            seconds = checkout_time - float(rows[0]['booked_time'])
+            self.turnovers += 1
+            self.turnover_seconds += seconds
+            self.longest_turnover = max(self.longest_turnover, seconds)
+
+    def read_sales(self, offset: int = 0):
+        """Yield the rows of path grouped by sale, streaming the file
+
+        With an offset, reading starts at that byte, which must be the
+        start of a row after the header.
+        """
+        import csv
+        if self.file is not None:
+            self.file.flush()
+        try:
+            file = open(self.path, newline='', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with file:
+            if offset:
+                file.seek(offset)
+                rows = csv.DictReader(file, SalesHistory.columns)
+            else:
+                rows = csv.DictReader(file)
+            sale, sale_number = [], None
+            for row in rows:
+                if None in row.values():
+                    break  # torn last row, cut off by open()
+                if row['sale'] != sale_number and sale:
+                    yield sale
+                    sale = []
+                sale_number = row['sale']
+                sale.append(row)
+            if sale:
+                yield sale
+
+    def get_item_revenue(self, menu_id: str) -> tuple[int, int]:
+        """(quantity, revenue) of a menu"""
+        return tuple(self.item_totals.get(menu_id, (0, 0)))
+
+    def get_hour_revenue(self, timestamp: float) -> int:
+        return self.hourly_revenue.get(int(timestamp // 3600), 0)
+
+    def get_average_turnover(self) -> float:
+        """Average seconds from booking to checkout"""
+        return self.turnover_seconds / self.turnovers if self.turnovers else 0.0
+
+    def get_summary(self) -> dict:
+        return {
+            'sales': self.sales,
+            'revenue': self.revenue,
+            'category_revenue': dict(self.category_revenue),
+            'average_turnover_seconds': self.get_average_turnover(),
+            'longest_turnover_seconds': self.longest_turnover,
+            'current_hour_revenue': self.get_hour_revenue(time.time()),
+        }
+
+    def export(self, path: str, since: float = None, until: float = None,
+               block_size: int = 1 << 22) -> int:
+        """Copy the sales between since and until to a CSV or Parquet file
+
+        Rows are streamed, a Parquet file (needs pyarrow) is converted
+        in blocks of block_size bytes, one row group per block. Returns
+        the number of rows.
+        """
+        if path.endswith('.parquet'):
+            return self.export_parquet(path, since, until, block_size)
+
+        def is_selected(checkout_time: float) -> bool:
+            return ((since is None or checkout_time >= since)
+                    and (until is None or checkout_time < until))
+
+        import csv
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, SalesHistory.columns)
+            writer.writeheader()
+            for sale in self.read_sales():
+                if is_selected(float(sale[0]['checkout_time'])):
+                    writer.writerows(sale)
+                    count += len(sale)
+        return count
+
+    def export_parquet(self, path: str, since: float, until: float, block_size: int) -> int:
+        """Parquet side of export, pyarrow parses and filters the CSV blocks"""
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.csv
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {'sale': pyarrow.int64(), 'checkout_time': pyarrow.float64(),
+                 'booked_time': pyarrow.float64(), 'table': pyarrow.int64(),
+                 'price': pyarrow.int64(), 'quantity': pyarrow.int64(),
+                 'amount': pyarrow.int64()}
+        schema = pyarrow.schema([(column, types.get(column, pyarrow.string()))
+                                 for column in SalesHistory.columns])
+        if self.file is not None:
+            self.file.flush()
+        if not os.path.exists(self.path):
+            pyarrow.parquet.write_table(schema.empty_table(), path)
+            return 0
+
+        reader = pyarrow.csv.open_csv(
+            self.path, read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+            convert_options=pyarrow.csv.ConvertOptions(
+                column_types=schema, strings_can_be_null=False))
+        count = 0
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for batch in reader:
+                if since is not None or until is not None:
+                    checkout_time = batch.column('checkout_time')
+                    mask = pyarrow.compute.and_(
+                        pyarrow.compute.greater_equal(checkout_time, since if since is not None else float('-inf')),
+                        pyarrow.compute.less(checkout_time, until if until is not None else float('inf')))
+                    batch = batch.filter(mask)
+                if batch.num_rows:
+                    writer.write_batch(batch)
+                    count += batch.num_rows
+        return count
+
+    def print_report(self, top: int = 5) -> None:
+        def rupiah(amount: int) -> str:
+            return f"Rp{amount:,}".replace(',', '.')
+
+        summary = self.get_summary()
+        print(f"{summary['sales']} sales, revenue {rupiah(summary['revenue'])}")
+        for category, revenue in summary['category_revenue'].items():
+            print(f"  {category:<8} {rupiah(revenue)}")
+        print(f"  average turnover {summary['average_turnover_seconds'] / 60:.1f} min, "
+              f"longest {summary['longest_turnover_seconds'] / 60:.1f} min")
+        best = heapq.nlargest(top, self.item_totals.items(), key=lambda item: item[1][1])
+        for menu_id, (quantity, revenue) in best:
+            print(f"  {menu_id:<10} x{quantity:<6} {rupiah(revenue)}")
+
+
+class MenuWatcher:
+    """Reload the menu file when it changes, applying only the difference
+
+    poll() only stats the file. A new mtime or size is parsed once it
+    stayed the same for one more poll, so a file still being written is
+    not loaded half way. The parsed catalog is diffed against
+    Menu.catalog by menu id: changes of price or additional info only
+    are written into the current catalog, which keeps its search index,
+    otherwise the parsed catalog replaces it. Menu that were only
+    reordered are not reported as changed, but the parsed catalog
+    replaces the current one, so listeners must show the menu in the
+    order of the new Menu.catalog. Booked orders, then the listeners,
+    are updated with the added, removed and changed ids.
+
+    prepare() parses and diffs and may run on a worker thread, apply()
+    must run on the thread owning Menu.catalog.
+    """
+    interval = 1.0  # seconds between polls
+    listeners = []  # called with (added, removed, changed) menu ids
+    in_place_limit = 256  # more changed menu replace the catalog, sorted by prepare()
+
+    def __init__(self, path: str = 'menu.txt', columnar: bool = False) -> None:
+        self.path = path
+        self.columnar = columnar
+        self.loaded_key = self.get_key()
+        self.pending_key = self.loaded_key
+        self.pending = None  # future of prepare() started by poll_in_background()
+
+    @staticmethod
+    def subscribe(listener) -> None:
+        MenuWatcher.listeners.append(listener)
+
+    @staticmethod
+    def unsubscribe(listener) -> None:
+        if listener in MenuWatcher.listeners:
+            MenuWatcher.listeners.remove(listener)
+
+    def get_key(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None  # being replaced, try again on the next poll
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_due(self) -> bool:
+        """The file changed and stayed the same since the last poll"""
+        key = self.get_key()
+        if key is None or key == self.loaded_key:
+            self.pending_key = self.loaded_key
+            return False
+        if key != self.pending_key:
+            self.pending_key = key  # wait until the writes are over
+            return False
+        self.loaded_key = key
+        return True
+
+    def poll(self) -> tuple[list[str], list[str], list[str]] | None:
+        """Reload if the file changed, returns the ids it changed"""
+        return self.reload() if self.is_due() else None
+
+    def poll_in_background(self, executor) -> tuple[list[str], list[str], list[str]] | None:
+        """poll() with prepare() submitted to executor
+
+        The reload is applied by the first call after prepare() is done,
+        so keep calling it from the thread owning Menu.catalog.
+        """
+        if self.pending is None:
+            if self.is_due():
+                self.pending = executor.submit(self.prepare)
+            return None
+        if not self.pending.done():
+            return None
+        future, self.pending = self.pending, None
+        return self.apply(*future.result())
+
+    def reload(self) -> tuple[list[str], list[str], list[str]]:
+        return self.apply(*self.prepare())
+
+    def prepare(self) -> tuple[MenuCatalog, tuple, tuple]:
+        """Parse the file and diff it against the current Menu.catalog"""
+        base = Menu.catalog, Menu.catalog.version
+        catalog, errors = parse_menu(self.path, self.columnar)
+        report_menu_errors(self.path, errors)
+        changes = MenuWatcher.diff(base[0], catalog)
+        if MenuWatcher.is_replacing(changes):
+            catalog.build_indexes()  # index it here, not on the Tk thread
+        return catalog, base, changes
+
+    @staticmethod
+    def is_replacing(changes: tuple) -> bool:
+        """The parsed catalog replaces Menu.catalog instead of updating it"""
+        added, removed, changed, reordered = changes
+        return bool(added or removed or reordered or len(changed) > MenuWatcher.in_place_limit)
+
+    @staticmethod
+    def diff(base: MenuCatalog, catalog: MenuCatalog) -> tuple:
+        """(added, removed, changed, reordered) from base to catalog"""
+        added, removed, changed = base.diff(catalog)
+        reordered = not (added or removed) and not base.has_same_order(catalog)
+        return added, removed, changed, reordered
+
+    @Instrument.timed
+    def apply(self, catalog: MenuCatalog, base: tuple, changes: tuple) -> tuple[list[str], list[str], list[str]]:
+        """Bring a prepared catalog in, returns the ids it changed"""
+        if base != (Menu.catalog, Menu.catalog.version):
+            changes = MenuWatcher.diff(Menu.catalog, catalog)  # changed while parsing
+        added, removed, changed, reordered = changes
+        if not (added or removed or changed or reordered):
+            return added, removed, changed
+        if MenuWatcher.is_replacing(changes) or not Menu.catalog.update_menus(catalog, changed):
+            Menu.catalog = catalog
+        with Table.lock:
+            for order in Table.all_tables.values():
+                if order is not None:
+                    order.update_menus(removed + changed)
+        for listener in list(MenuWatcher.listeners):
+            listener(added, removed, changed)
+        print(f"{self.path} reloaded: {len(added)} added, {len(removed)} removed, "
+              f"{len(changed)} changed{', reordered' if reordered else ''}.")
+        return added, removed, changed
+
+
+class TableServer:
+    """Local asyncio server owning Table state for several kiosks
+
+    Clients send one JSON object per line, {"id": ..., "op": ...} with op
+    "state", "book", "checkout" or "quantity". The reply has the same id
+    and the Journal records of the changes it made. The changes are
+    pushed to every other client as plain records, batched into one
+    write per client per event loop iteration.
+    """
+
+    def __init__(self, address: str, menu_watcher: MenuWatcher = None,
+                 journal: Journal = None) -> None:
+        self.address = address
+        self.menu_watcher = menu_watcher
+        self.journal = journal
+        self.tasks = []  # the loop only keeps weak references to tasks
+        self.writers = set()
+        self.origin = None
+        self.records = []  # changes made by the request being handled
+        self.pushes = []   # (origin writer, line) waiting for flush_pushes()
+
+    def run(self) -> None:
+        import asyncio
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        import asyncio
+        Table.subscribe(self.on_table_change)
+        address = parse_address(self.address)
+        if isinstance(address, str):
+            server = await asyncio.start_unix_server(self.handle_client, path=address)
+        else:
+            server = await asyncio.start_server(self.handle_client, *address)
+        print(f"Serving {len(Table.all_tables)} tables on {self.address}")
+        if self.menu_watcher:
+            self.tasks.append(asyncio.create_task(self.watch_menu()))
+        if self.journal:
+            self.tasks.append(asyncio.create_task(self.sync_journal()))
+        async with server:
+            await server.serve_forever()
+
+    async def watch_menu(self) -> None:
+        """Poll the menu file, changes to orders are pushed to every client"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.menu_watcher.interval)
+            if self.menu_watcher.is_due():
+                prepared = await loop.run_in_executor(None, self.menu_watcher.prepare)
+                self.origin = None
+                self.menu_watcher.apply(*prepared)
+
+    async def sync_journal(self) -> None:
+        """fsync the journal lines left behind by a quiet period"""
+        import asyncio
+        while True:
+            await asyncio.sleep(self.journal.sync_interval)
+            self.journal.sync_if_due()
+
+    def on_table_change(self, event: str, table_number: int, menu_id: str = None) -> None:
+        import asyncio
+        if event == "hold":
+            return  # holds belong to one kiosk
+        record = Journal.get_record(event, table_number, menu_id)
+        self.records.append(record)
+        if not self.pushes:
+            asyncio.get_running_loop().call_soon(self.flush_pushes)
+        self.pushes.append((self.origin, json.dumps(
+            record, separators=(',', ':')).encode() + b'\n'))
+
+    def flush_pushes(self) -> None:
+        pushes, self.pushes = self.pushes, []
+        for writer in self.writers:
+            data = b''.join(line for origin, line in pushes if origin is not writer)
+            if data:
+                writer.write(data)
+
+    async def handle_client(self, reader, writer) -> None:
+        self.writers.add(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = {'op': None}
+                reply = self.handle_request(request, writer)
+                writer.write(json.dumps(reply, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def handle_request(self, request: dict, writer) -> dict:
+        self.origin, self.records = writer, []
+        reply = {'id': request.get('id'), 'ok': True}
+        try:
+            match request['op']:
+                case "state":
+                    reply['table_count'] = len(Table.all_tables)
+                    reply.update(Journal.get_state())
+                case "book":
+                    order = OrderEngine.create_order(
+                        request['username'], request.get('table'))
+                    for menu_id, quantity in request.get('items', {}).items():
+                        OrderEngine.set_quantity(order, menu_id, quantity)
+                    OrderEngine.book(order)
+                    reply['table'] = order.table_number
+                case "checkout":
+                    OrderEngine.checkout(request['table'])
+                case "quantity":
+                    order = OrderEngine.get_booked_order(request['table'])
+                    OrderEngine.set_quantity(
+                        order, request['menu'], request['quantity'])
+                case op:
+                    raise ValueError(f"unknown op '{op}'")
+        except (ValueError, KeyError, TypeError) as error:
+            reply = {'id': request.get('id'), 'ok': False, 'error': str(error)}
+        finally:
+            self.origin = None
+        reply['records'] = self.records
+        return reply
+
+
+class TableClient:
+    """Persistent connection from a kiosk to a TableServer
+
+    Table stays a local mirror of the server. Records in a reply are
+    applied as soon as the reply arrives. Records pushed for changes
+    made by other kiosks are queued by the reader thread and applied on
+    the Tk thread by apply_pushed(), which notifies Table listeners.
+
+    A request is only sent again when sending it failed. Once sent
+    without a reply, the server may have applied it, so its outcome is
+    read from the state copied on reconnecting.
+    """
+
+    def __init__(self, address: str, timeout: float = 5.0) -> None:
+        self.address = address
+        self.timeout = timeout
+        self.socket = None
+        self.lock = threading.Lock()
+        self.replies = None  # queues of the current connection
+        self.pushed = None
+        self.last_id = 0
+
+    def connect(self) -> None:
+        """Open the connection and copy the server state into Table"""
+        import socket
+        address = parse_address(self.address)
+        family = socket.AF_UNIX if isinstance(
+            address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        self.socket.settimeout(None)
+        # New queues, so the closing reader of an old connection cannot
+        # wake up a request or push stale records on this one
+        self.replies, self.pushed = queue.Queue(), queue.Queue()
+        reader = threading.Thread(target=self.read_loop,
+                                  args=(self.socket, self.replies, self.pushed),
+                                  name='TableClient', daemon=True)
+        reader.start()
+
+        state = self.send({'op': 'state'})
+        if state is None:
+            raise ConnectionError('Koneksi ke server terputus.')
+        Table.setup(state['table_count'])
+        Journal.restore_state(state)
+
+    def close(self) -> None:
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def read_loop(self, connection, replies: queue.Queue, pushed: queue.Queue) -> None:
+        try:
+            for line in connection.makefile('rb'):
+                message = json.loads(line)
+                if 'id' in message:
+                    replies.put(message)
+                else:
+                    pushed.put(message)
+        except (OSError, ValueError):
+            pass
+        replies.put(None)  # wake up a waiting request
+
+    def send(self, request: dict) -> dict | None:
+        """Reply to request, None if it was sent but no reply came
+
+        Raises OSError if the request could not be sent.
+        """
+        with self.lock:
+            self.last_id += 1
+            request['id'] = self.last_id
+            self.socket.sendall(json.dumps(request).encode() + b'\n')
+            while True:
+                try:
+                    reply = self.replies.get(timeout=self.timeout)
+                except queue.Empty:
+                    return None  # slow server, the request may be applied later
+                if reply is None:
+                    return None  # connection lost
+                if reply['id'] == request['id']:
+                    return reply
+
+    def request(self, op: str, **kwargs) -> dict:
+        """Send request, reconnecting once if the connection was lost"""
+        try:
+            reply = self.send({'op': op, **kwargs})
+        except OSError:
+            # Not sent, so it is safe to send again
+            self.close()
+            self.connect()
+            reply = self.send({'op': op, **kwargs})
+        if reply is None:
+            self.close()
+            self.connect()
+            reply = TableClient.get_outcome(op, kwargs)
+        # Pushed records arrived before the reply, apply them first
+        self.apply_pushed()
+        for record in reply['records']:
+            Journal.apply(record)
+        if not reply['ok']:
+            raise ValueError(reply['error'])
+        return reply
+
+    @staticmethod
+    def get_outcome(op: str, request: dict) -> dict:
+        """Reply to an unanswered request, from the resynced Table"""
+        if op == 'book':
+            table_number = Table.find_by_username(request['username'])
+            ok = table_number is not None and request.get('table') in (None, table_number)
+        elif op == 'checkout':
+            table_number = request['table']
+            ok = Table.all_tables.get(table_number) is None
+        else:
+            table_number, ok = request.get('table'), False
+        return {'ok': ok, 'table': table_number, 'records': [],
+                'error': 'Server tidak membalas, permintaan tidak tercatat.'}
+
+    def apply_pushed(self) -> None:
+        if self.pushed is None:
+            return
+        while not self.pushed.empty():
+            Journal.apply(self.pushed.get())
+
+
+class OrderEngine:
+    """Order operations on Table without any widget
+
+    Invalid operations raise ValueError with a message for the user.
+    With a TableClient set, bookings and checkouts go to the server.
+    """
+    client: TableClient = None
+
+    @staticmethod
+    def validate_username(username: str) -> str | None:
+        """Error message if username is empty or already used"""
+        if Table.normalize_username(username) == '':
+            return 'Nama tidak boleh kosong.'
+        if Table.find_by_username(username) is not None:
+            return 'Nama sudah dipakai.'
+        return None
+
+    @staticmethod
+    def create_order(username: str, table_number: int = None) -> Order:
+        error = OrderEngine.validate_username(username)
+        if error:
+            raise ValueError(error)
+        if table_number is None:
+            table_number = Table.random_available()
+            if table_number is None:
+                raise ValueError('Meja sedang penuh.')
+        elif not Table.is_available(table_number):
+            raise ValueError(f'Meja {table_number} tidak tersedia.')
+        return Order(table_number, username)
+
+    @staticmethod
+    def set_quantity(order: Order, menu_id: str, quantity: int) -> None:
+        if menu_id not in Menu.catalog:
+            raise ValueError(f"Menu '{menu_id}' tidak ada.")
+        if quantity < 0:
+            raise ValueError('Jumlah tidak boleh negatif.')
+        order.set_quantity(order.get_ordered_menu(menu_id), quantity)
+
+    @staticmethod
+    def book(order: Order) -> None:
+        if OrderEngine.client:
+            OrderEngine.client.request('book', table=order.table_number, username=order.username,
+                                       items=Journal.get_items(order))
+            order.hold = None
+            return
+        with Table.lock:
+            if order.hold is not None:
+                token, order.hold = order.hold, None
+                if Table.confirm(order.table_number, token, order):
+                    return
+                # The hold expired, book the table anyway if it is still free
+                if not Table.is_available(order.table_number):
+                    raise ValueError(
+                        f'Meja {order.table_number} sudah tidak tersedia.')
+            elif not Table.is_available(order.table_number):
+                raise ValueError(
+                    f'Meja {order.table_number} tidak tersedia.')
+            Table.book(order.table_number, order)
+
+    @staticmethod
+    def get_booked_order(table_number: int) -> Order:
+        order = Table.all_tables.get(table_number)
+        if order is None:
+            raise ValueError(f'Meja {table_number} kosong.')
+        return order
+
+    @staticmethod
+    def checkout(table_number: int) -> Order:
+        order = OrderEngine.get_booked_order(table_number)
+        if OrderEngine.client:
+            OrderEngine.client.request('checkout', table=table_number)
+        else:
+            Table.checkout(table_number)
+        return order
+
+
+def report_menu_errors(path: str, errors: list[tuple[int, str]]) -> None:
+    for line_number, reason in errors:
+        print(f"{path}:{line_number}: {reason}")
+
+
+def parse_menu(path: str, columnar: bool = False) -> tuple[MenuCatalog, list[tuple[int, str]]]:
+    """Parse a menu file into a new catalog, without indexes or cache"""
+    menu_types = ColumnarMenuCatalog.menu_types
+    menu_class = None
+    catalog, errors = ColumnarMenuCatalog() if columnar else MenuCatalog(), []
+    with open(path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            # Menu type
+            if line.startswith("==="):
+                menu_type = line.replace("===", '', 1).strip()
+                menu_class = menu_types.get(menu_type)
+                if menu_class is None:
+                    errors.append(
+                        (line_number, f"unknown menu type '{menu_type}'"))
+                continue
+            # Menu data
+            menu_data = line.split(';')
+            if menu_class is None:
+                errors.append((line_number, "row outside a valid menu type"))
+            elif len(menu_data) != 4:
+                errors.append(
+                    (line_number, f"expected 4 fields, got {len(menu_data)}"))
+            elif not (menu_data[2].isdigit() and menu_data[3].isdigit()):
+                errors.append(
+                    (line_number, "price and additional info must be integers"))
+            elif menu_data[0] in catalog:
+                errors.append(
+                    (line_number, f"duplicate menu id '{menu_data[0]}'"))
+            else:
+                catalog.add(menu_class(menu_data[0], menu_data[1],
+                                       int(menu_data[2]), int(menu_data[3])))
+
+    return catalog, errors
+
+
+def fetch_menu(path: str = 'menu.txt', use_cache: bool = True,
+               columnar: bool = False) -> list[tuple[int, str]]:
+    """Fetch menu from 'menu.txt' into Menu.catalog, see load_menu()"""
+    Menu.catalog, errors = load_menu(path, use_cache, columnar)
+    return errors
+
+
+def load_menu(path: str = 'menu.txt', use_cache: bool = True,
+              columnar: bool = False) -> tuple[MenuCatalog, list[tuple[int, str]]]:
+    """Load a menu file into a new catalog, safe to call from any thread
+
+    The file is streamed line by line. Malformed rows are skipped and
+    returned as (line number, reason) instead of stopping the load.
+    The caller installs the catalog in Menu.catalog, so reloading never
+    duplicates items. It is pickled to MenuCatalog.cache_dir, behind a
+    JSON line with the file's mtime and size, and only unpickled while
+    the file is not modified. With columnar, a ColumnarMenuCatalog is
+    loaded. Both are cached with their search index and sort orders, so
+    the first search or sort does no indexing. Unpickling still builds
+    one Menu per row for the object catalog, only the columnar cache
+    loads a large menu several times faster than parsing it.
+    """
+    import hashlib
+    cache_path = os.path.join(MenuCatalog.cache_dir, hashlib.sha256(
+        os.path.abspath(path).encode()).hexdigest() + '.pickle')
+    stat = os.stat(path)
+    source_key = [MenuCatalog.cache_version, columnar, stat.st_mtime_ns, stat.st_size]
+    if use_cache:
+        try:
+            with open(cache_path, 'rb') as file:
+                if json.loads(file.readline()) == source_key:
+                    catalog, errors = pickle.load(file)
+                    report_menu_errors(path, errors)
+                    return catalog, errors
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass  # missing or damaged cache, parse the source file
+
+    catalog, errors = parse_menu(path, columnar)
+    catalog.build_indexes()
+    report_menu_errors(path, errors)
+    if use_cache:
+        try:
+            os.makedirs(MenuCatalog.cache_dir, mode=0o700, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(json.dumps(source_key).encode() + b'\n')
+                pickle.dump((catalog, errors), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            print('Failed to write menu cache.')
+    return catalog, errors
+
+
+def run_batch(file) -> dict[str, list[float]]:
+    """Apply order commands from a file, then report latency per command
+
+    Commands, one per line ('#' starts a comment):
+        order <username> [table=<number>] [<menu id>=<quantity> ...]
+        set <table number> <menu id> <quantity>
+        checkout <table number>
+        price <category or ALL> <percent>
+    A username with spaces can be written with quotes.
+    """
+    import shlex
+    commands = {'order': batch_order, 'set': batch_set,
+                'checkout': batch_checkout, 'price': batch_price}
+    latencies = {name: [] for name in commands}
+    errors = 0
+    start = time.perf_counter()
+    for line_number, line in enumerate(file, start=1):
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as error:
+            print(f"line {line_number}: {error}")
+            errors += 1
+            continue
+        if not args:
+            continue
+        command = commands.get(args[0])
+        if command is None:
+            print(f"line {line_number}: unknown command '{args[0]}'")
+            errors += 1
+            continue
+        command_start = time.perf_counter()
+        try:
+            command(*args[1:])
+        except (ValueError, TypeError) as error:
+            print(f"line {line_number}: {error}")
+            errors += 1
+        latencies[args[0]].append(time.perf_counter() - command_start)
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} commands, {errors} errors in {elapsed:.3f} s "
+          f"({total / elapsed if elapsed else 0:,.0f} commands/s)")
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        p50, p95, p99 = (percentile(values, p) * 1e6 for p in (.5, .95, .99))
+        print(f"  {name:<8} n={len(values):<8} p50={p50:.1f}us "
+              f"p95={p95:.1f}us p99={p99:.1f}us max={values[-1] * 1e6:.1f}us")
+    return latencies
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def batch_order(username: str, *items: str) -> None:
+    table_number = None
+    quantities = []
+    for item in items:
+        key, _, value = item.partition('=')
+        if key == 'table':
+            table_number = int(value)
+        else:
+            quantities.append((key, int(value)))
+    order = OrderEngine.create_order(username, table_number)
+    for menu_id, quantity in quantities:
+        OrderEngine.set_quantity(order, menu_id, quantity)
+    OrderEngine.book(order)
+
+
+def batch_set(table_number: str, menu_id: str, quantity: str) -> None:
+    order = OrderEngine.get_booked_order(int(table_number))
+    OrderEngine.set_quantity(order, menu_id, int(quantity))
+
+
+def batch_checkout(table_number: str) -> None:
+    OrderEngine.checkout(int(table_number))
+
+
+def batch_price(category: str, percent: str) -> None:
+    if category != "ALL" and category not in MenuCatalog.categories:
+        raise ValueError(f"unknown menu type '{category}'")
+    Menu.catalog.reprice(category, float(percent))
+
+
+def parse_address(address: str) -> str | tuple[str, int]:
+    """'host:port' to a TCP address, anything else is a Unix socket path"""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def run_load_test(address: str, clients: int, operations: int) -> None:
+    """Book and checkout from many simulated kiosks, then report latency"""
+    import asyncio
+    latencies = {'book': [], 'checkout': []}
+    errors = 0
+
+    async def kiosk(number: int) -> None:
+        nonlocal errors
+        address_ = parse_address(address)
+        if isinstance(address_, str):
+            reader, writer = await asyncio.open_unix_connection(address_)
+        else:
+            reader, writer = await asyncio.open_connection(*address_)
+        menu_id = next(iter(Menu.catalog)).id
+
+        async def request(op: str, **kwargs) -> dict:
+            start = time.perf_counter()
+            writer.write(json.dumps({'id': 0, 'op': op, **kwargs}).encode() + b'\n')
+            await writer.drain()
+            # Skip changes pushed from other kiosks, replies start with {"id"
+            while not (line := await reader.readline()).startswith(b'{"id"'):
+                if not line:
+                    raise ConnectionError("connection closed by the server")
+            latencies[op].append(time.perf_counter() - start)
+            return json.loads(line)
+
+        try:
+            for i in range(operations // 2):
+                reply = await request('book', username=f"kiosk{number}-{i}", items={menu_id: 1})
+                if not reply['ok']:
+                    errors += 1
+                    continue
+                reply = await request('checkout', table=reply['table'])
+                errors += not reply['ok']
+        except ConnectionError as error:
+            print(f"kiosk {number}: {error}")
+            errors += 1
+        writer.close()
+
+    async def run_all() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(kiosk(number) for number in range(clients)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_all())
+    total = sum(len(values) for values in latencies.values())
+    print(f"{clients} clients, {total} requests, {errors} rejected in {elapsed:.3f} s "
+          f"({total / elapsed:,.0f} requests/s)")
+    for op, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        p50, p95, p99 = (percentile(values, p) * 1e3 for p in (.5, .95, .99))
+        print(f"  {op:<8} n={len(values):<8} p50={p50:.2f}ms "
+              f"p95={p95:.2f}ms p99={p99:.2f}ms max={values[-1] * 1e3:.2f}ms")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Options shared by the window and the headless entry point"""
+    parser = argparse.ArgumentParser(
+        description="Kafe Daun-Daun Pacilkom v2.0")
+    parser.add_argument('--tables', type=int, default=10,
+                        help="number of tables in the cafe (default: 10)")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="apply order commands from FILE ('-' for stdin) without opening the window")
+    parser.add_argument('--state-dir', metavar='DIR',
+                        help="keep tables, orders and the sales history in DIR and "
+                             "restore them on startup")
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help="serve table state to kiosks on HOST:PORT or a Unix socket path")
+    parser.add_argument('--load-test', metavar='ADDRESS',
+                        help="book and checkout from simulated kiosks on the server on ADDRESS")
+    parser.add_argument('--clients', type=int, default=50,
+                        help="simulated kiosks for --load-test (default: 50)")
+    parser.add_argument('--operations', type=int, default=200,
+                        help="requests per simulated kiosk for --load-test (default: 200)")
+    parser.add_argument('--columnar', action='store_true',
+                        help="keep the menu in compact columns, for very large menus")
+    parser.add_argument('--sales-report', action='store_true',
+                        help="print the totals of the sales history and exit")
+    parser.add_argument('--export-sales', metavar='FILE',
+                        help="export the sales history to a .csv or .parquet FILE and exit")
+    return parser
+
+
+def is_headless(args: argparse.Namespace) -> bool:
+    return bool(args.batch or args.serve or args.load_test
+                or args.sales_report or args.export_sales)
+
+
+def run_headless(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    """Run the --batch, --serve, --load-test or sales history modes"""
+    # Kept where the table state is, a load test leaves it to its server
+    sales = None if args.load_test or not args.state_dir else \
+        SalesHistory(os.path.join(args.state_dir, 'sales.csv'))
+    if args.sales_report or args.export_sales:
+        if args.load_test:
+            parser.error("the sales history is kept by the server, not with --load-test")
+        if sales is None:
+            parser.error("the sales history is kept in --state-dir, pass it")
+        sales.load()
+        if args.export_sales:
+            try:
+                rows = sales.export(args.export_sales)
+            except ValueError as error:
+                parser.error(str(error))
+            print(f"{rows} rows written to {args.export_sales}")
+        if args.sales_report:
+            sales.print_report()
+        return
+
+    Table.setup(args.tables)
+    journal = Journal(args.state_dir) if args.state_dir else None
+    menu_watcher = MenuWatcher(columnar=args.columnar) if args.serve else None
+    fetch_menu(columnar=args.columnar)
+    if journal:
+        journal.open()
+    if sales:
+        sales.open()
+        journal.synced_with.append(sales.sync)  # both are kept in --state-dir
+    stop_sync, syncer = threading.Event(), None
+    if journal and args.batch:
+        # Commands from stdin may pause, TableServer syncs in its loop
+        syncer = threading.Thread(target=journal.sync_periodically, args=(stop_sync,),
+                                  daemon=True)
+        syncer.start()
+    try:
+        if args.serve:
+            TableServer(args.serve, menu_watcher, journal).run()
+        elif args.load_test:
+            run_load_test(args.load_test, args.clients, args.operations)
+        elif args.batch == '-':
+            run_batch(sys.stdin)
+        else:
+            with open(args.batch, encoding='utf-8') as file:
+                run_batch(file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if syncer:
+            stop_sync.set()
+            syncer.join()
+        if journal:
+            journal.close()
+        if sales:
+            sales.close()
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if not is_headless(args):
+        parser.error("nothing to do, pass --batch, --serve, --load-test, --sales-report "
+                     "or --export-sales (the window is C_JSK_2206081194_IlhamAbdillahAlhamdi_TP04.py)")
+    run_headless(args, parser)
+
+
+if __name__ == '__main__':
+    main()